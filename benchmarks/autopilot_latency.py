@@ -0,0 +1,45 @@
+import time
+
+from boards import lay_snake
+import engine
+from maps import walled_map
+from policies import Autopilot
+
+# Autopilot decision latency by board size and snake length, over ticks of the autopilot playing on its own.
+# Decisions right after the apples change restart the BFS distance field, and the field then grows by a bounded
+# amount per tick, so the worst tick should stay flat as the board grows.
+BOARDS = (16, 64, 256, 1024)
+LENGTHS = (10, 1000, 100000)
+DECISIONS = 500
+
+
+def measure(size, length):
+    level = engine.Level(1, walled_map(size, size), score_to_level_up=-1, apples_number=3)
+    for apple in level.apples:
+        level.grid.release(apple.x, apple.y)
+    level.apples.clear()
+    lay_snake(level.snake, size, size, length)
+    level.spawn_apples()
+    autopilot = Autopilot()
+
+    latencies = []
+    for _ in range(DECISIONS):
+        start = time.perf_counter()
+        direction = autopilot(level)
+        latencies.append(time.perf_counter() - start)
+        events = level.step(direction)
+        if events and events[-1].kind in engine.GAME_OVER_EVENTS:
+            break
+    latencies.sort()
+    return len(latencies), sum(latencies) / len(latencies) * 1e6, latencies[len(latencies) * 99 // 100] * 1e6, \
+        latencies[-1] * 1e6
+
+
+if __name__ == "__main__":
+    print(f"{'board':>10} {'length':>7} {'ticks':>6} {'mean us':>8} {'p99 us':>8} {'max us':>8}")
+    for size in BOARDS:
+        for length in LENGTHS:
+            if length > (size - 2) * (size - 3):
+                continue
+            ticks, mean, p99, worst = measure(size, length)
+            print(f"{size:>4}x{size:<5} {length:>7} {ticks:>6} {mean:>8.0f} {p99:>8.0f} {worst:>8.0f}")
@@ -0,0 +1,49 @@
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+import engine
+import batch
+from maps import walled_map
+
+# Game-steps per second of batch.BatchGame for growing N, against a Python loop over N engine.Game objects
+# (capped at SCALAR_LIMIT games, its per-step cost does not depend on N).
+TICKS = 200
+SIZES = (1, 16, 256, 4096, 16384)
+SCALAR_LIMIT = 1024
+DIRECTIONS = (None, engine.UP, engine.DOWN, engine.LEFT, engine.RIGHT)
+
+
+def make_level():
+    return engine.Level(1, walled_map(16, 9), 8, 1, 0, -1, None, None, 2)
+
+
+def scalar_throughput(n, ticks):
+    games = [engine.Game({1: make_level()}) for _ in range(n)]
+    start = time.perf_counter()
+    for _ in range(ticks):
+        for game in games:
+            game.step(random.choice(DIRECTIONS))
+    return n * ticks / (time.perf_counter() - start)
+
+
+def batch_throughput(n, ticks):
+    game = batch.BatchGame(make_level(), n, seed=0)
+    rng = np.random.default_rng(0)
+    actions = rng.integers(-1, 4, size=(ticks, n))
+    start = time.perf_counter()
+    for tick in range(ticks):
+        game.step(actions[tick])
+    return n * ticks / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    print(f"{'N':>8} {'scalar steps/s':>16} {'batch steps/s':>16} {'speed-up':>9}")
+    for n in SIZES:
+        scalar = scalar_throughput(min(n, SCALAR_LIMIT), TICKS)
+        batched = batch_throughput(n, TICKS)
+        print(f"{n:>8} {scalar:>16,.0f} {batched:>16,.0f} {batched / scalar:>8.1f}x")
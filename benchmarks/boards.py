@@ -0,0 +1,25 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+from engine import UP, DOWN, RIGHT
+
+# Shared board set-ups for the benchmarks.
+
+
+def serpentine(width, height):
+    # Directions that walk a snake restarted at (1, 2) through every interior cell of a walled board, column by column.
+    directions = [DOWN] * (height - 4)
+    for column in range(2, width - 1):
+        directions.append(RIGHT)
+        directions.extend([UP if column % 2 == 0 else DOWN] * (height - 3))
+    return directions
+
+
+def lay_snake(snake, width, height, length):
+    directions = serpentine(width, height)
+    snake.restart(1, 2)
+    snake.grow(length - 2)
+    for direction in directions[:length - 2]:
+        snake.update(direction)
+    return directions[length - 2:]
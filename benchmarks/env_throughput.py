@@ -0,0 +1,46 @@
+import functools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+import campaign
+import env
+
+# Environment steps per second on one core for env.SnakeEnv and env.VectorEnv on a campaign level, with random
+# actions, and with frame skip (each env step is that many game ticks).
+STEPS = 50000
+LEVEL = 3
+VECTOR_SIZES = (1, 16, 256)
+FRAME_SKIPS = (1, 4)
+
+
+def single(frame_skip):
+    environment = env.SnakeEnv(campaign.build_level(LEVEL), frame_skip, max_ticks=1000, seed=0)
+    environment.reset()
+    rng = random.Random(0)
+    actions = [rng.randrange(env.ACTION_COUNT) for _ in range(STEPS)]
+    start = time.perf_counter()
+    for action in actions:
+        _, _, terminated, truncated, _ = environment.step(action)
+        if terminated or truncated:
+            environment.reset()
+    return STEPS / (time.perf_counter() - start)
+
+
+def vector(n, frame_skip):
+    environments = env.VectorEnv(functools.partial(campaign.build_level, LEVEL), n, frame_skip, max_ticks=1000, seed=0)
+    environments.reset()
+    rng = random.Random(0)
+    batches = [[rng.randrange(env.ACTION_COUNT) for _ in range(n)] for _ in range(STEPS // n)]
+    start = time.perf_counter()
+    for actions in batches:
+        environments.step(actions)
+    return len(batches) * n / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    for frame_skip in FRAME_SKIPS:
+        print(f"frame skip {frame_skip}: SnakeEnv {single(frame_skip):8.0f} steps/s, "
+              + ", ".join(f"VectorEnv({n}) {vector(n, frame_skip):8.0f}" for n in VECTOR_SIZES))
@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+import time
+
+source_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source')
+sys.path.insert(0, source_path)
+os.chdir(source_path)
+import campaign
+import engine
+import export
+from policies import Autopilot
+from replay import Replay
+
+# Offscreen export speed of a TICKS-tick autopilot game against real time (the level's tick rate): raw frames
+# written to os.devnull at full and half size, and PNG frames for the first PNG_TICKS ticks.
+TICKS = 10000
+PNG_TICKS = 300
+
+
+def autopilot_replay():
+    game = engine.Game(campaign.build_levels(), 1, seed=7)
+    autopilot = Autopilot()
+    while game.ticks < TICKS:
+        game.step(autopilot(game.level))
+    return Replay.from_game(game)
+
+
+def timed_export(replay, path, scale, ticks=None):
+    start = time.perf_counter()
+    frames = export.export_replay(replay, path, scale, ticks=ticks)
+    elapsed = time.perf_counter() - start
+    return frames, elapsed, frames / engine.FPS / elapsed
+
+
+if __name__ == "__main__":
+    export.setup()
+    replay = autopilot_replay()
+    for scale in (1.0, 0.5):
+        frames, elapsed, speed = timed_export(replay, os.devnull, scale)
+        print(f"raw, scale {scale}: {frames} frames in {elapsed:5.1f} s, {speed:6.0f}x real time")
+    with tempfile.TemporaryDirectory() as directory:
+        frames, elapsed, speed = timed_export(replay, os.path.join(directory, "frames"), 0.5, PNG_TICKS)
+        print(f"png, scale 0.5: {frames} frames in {elapsed:5.1f} s, {speed:6.0f}x real time")
@@ -0,0 +1,56 @@
+import os
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+source_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source')
+sys.path.insert(0, source_path)
+os.chdir(source_path)
+import pygame
+import main
+
+# Per-frame HUD cost: the old SysFont lookup, render and panel allocation on every frame against the
+# font registry and text panel cache, with the score changing every SCORE_EVERY frames.
+FRAMES = 3000
+SCORE_EVERY = 20
+
+
+def uncached_panel(surface, name, size, text, position):
+    font = pygame.font.SysFont(name, size)
+    text_surface = font.render(text, True, main.WHITE)
+    panel = pygame.Surface((text_surface.get_width() + 20, text_surface.get_height() + 10))
+    panel.set_alpha(160)
+    panel.fill((0, 0, 0))
+    panel.blit(text_surface, (10, 5))
+    surface.blit(panel, position)
+
+
+def uncached_hud(surface, frame):
+    uncached_panel(surface, "Roboto", 40, "Score: " + str(frame // SCORE_EVERY), (1100, 15))
+    uncached_panel(surface, "Roboto", 40, "Level: 1", (15, 15))
+    uncached_panel(surface, "Roboto", 20, "Goal to the next level: 10 points", (500, 680))
+
+
+def cached_hud(surface, frame):
+    surface.blit(main.text_panel(main.FONT_HUD, "Score: " + str(frame // SCORE_EVERY)), (1100, 15))
+    surface.blit(main.text_panel(main.FONT_HUD, "Level: 1"), (15, 15))
+    surface.blit(main.text_panel(main.FONT_GOAL, "Goal to the next level: 10 points"), (500, 680))
+
+
+def timed(hud, surface):
+    start = time.perf_counter()
+    for frame in range(FRAMES):
+        hud(surface, frame)
+    return (time.perf_counter() - start) / FRAMES * 1e6
+
+
+if __name__ == "__main__":
+    pygame.init()
+    window = pygame.display.set_mode((main.WINDOW_WIDTH, main.WINDOW_HEIGHT))
+    main.load_fonts()
+    before = timed(uncached_hud, window)
+    after = timed(cached_hud, window)
+    print(f"uncached HUD: {before:8.1f} us/frame")
+    print(f"cached HUD:   {after:8.1f} us/frame ({before / after:.1f}x)")
+    print(main.text_panel.cache_info())
@@ -0,0 +1,52 @@
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+source_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source')
+sys.path.insert(0, source_path)
+os.chdir(source_path)
+import pygame
+import engine
+import main
+from maps import walled_map
+
+# Level build time, restart time (a game over), simulation cost per tick and render cost per frame as the map grows
+# past the window.
+# Maps larger than the window scroll with the head and only draw what the camera sees.
+TICKS = 2000
+SIZES = ((16, 9), (100, 100), (1000, 1000), (2000, 2000))
+
+
+def play(width, height):
+    random.seed(0)
+    start = time.perf_counter()
+    level = main.Level(1, walled_map(width, height, "WALL-1", "GRASS"), score_to_level_up=-1, apples_number=8)
+    game = engine.Game({1: level}, seed=0)
+    build = time.perf_counter() - start
+    steps = []
+    frames = []
+    for _ in range(TICKS):
+        start = time.perf_counter()
+        game.step(random.choice((None, None, None, engine.UP, engine.DOWN, engine.LEFT, engine.RIGHT)))
+        steps.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        pygame.display.update(level.redraw())
+        frames.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    level.start()
+    restart = time.perf_counter() - start
+    return build * 1000, restart * 1000, sum(steps) / TICKS * 1e6, sum(frames) / TICKS * 1000, len(level.chunks)
+
+
+if __name__ == "__main__":
+    pygame.init()
+    main.window = pygame.display.set_mode((main.WINDOW_WIDTH, main.WINDOW_HEIGHT))
+    main.load_fonts()
+    main.atlas.load()
+    print(f"{'map':>11} {'build ms':>9} {'restart ms':>11} {'step us':>8} {'frame ms':>9} {'chunks':>7}")
+    for width, height in SIZES:
+        build, restart, step, frame, chunks = play(width, height)
+        print(f"{width:>5}x{height:<5} {build:9.1f} {restart:11.1f} {step:8.2f} {frame:9.3f} {chunks:>7}")
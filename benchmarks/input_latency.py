@@ -0,0 +1,249 @@
+import argparse
+import atexit
+import os
+import random
+import runpy
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source', 'main.py')
+sys.path.insert(0, os.path.dirname(MAIN_PATH))
+import campaign
+import engine
+import scores
+
+# Input-to-photon latency of the real game loop, headless. A thread posts arrow key presses with
+# pygame.event.post at random moments, one at a time, turning the snake towards a free cell. Each press is timed
+# to the tick whose Snake.update turns the head, and from there to the end of the next display.update, the first
+# frame that shows the turn. Frame-time and tick-time jitter are the spread of the intervals between game frames
+# and between ticks, with menus left out. Menus (the title, game over, level up) are continued with SPACE, and a
+# press still waiting when one opens is dropped.
+#
+#   python input_latency.py --samples 100 --max-p95 250
+#
+# exits with status 1 when the 95th percentile of the latency is over the limit, so loop changes can be checked.
+# run() plays one measured session in the calling process and returns a LatencyReport, e.g. for a test:
+#
+#   assert input_latency.run(samples=50).p95() < 0.25
+SAMPLES = 100
+TIMEOUT = 120
+SPACE = pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE)
+DIRECTION_KEYS = {engine.UP: pygame.K_UP, engine.DOWN: pygame.K_DOWN, engine.LEFT: pygame.K_LEFT,
+                  engine.RIGHT: pygame.K_RIGHT}
+TURNS = {engine.UP: (engine.LEFT, engine.RIGHT), engine.DOWN: (engine.LEFT, engine.RIGHT),
+         engine.LEFT: (engine.UP, engine.DOWN), engine.RIGHT: (engine.UP, engine.DOWN)}
+
+
+class Press:
+    def __init__(self, direction):
+        self.direction = direction
+        self.posted = time.perf_counter()
+        self.ticked = None
+
+
+class LatencyProbe:
+    # Hooks Snake.update, pygame.display.update and pygame.event.wait before main.py runs.
+    def __init__(self, samples, rng):
+        self.samples = samples
+        self.rng = rng
+        self.lock = threading.Lock()
+        self.snake = None
+        self.press = None
+        self.done = threading.Event()
+        self.presses = []
+        self.frames = []
+        self.ticks = []
+        self.menus = 0
+
+    def install(self):
+        update = engine.Snake.update
+        present = pygame.display.update
+        probe = self
+
+        def snake_update(snake, direction=None):
+            turned_from = snake.direction
+            update(snake, direction)
+            probe.ticked(snake, turned_from)
+
+        def display_update(*args):
+            present(*args)
+            probe.presented()
+
+        def event_wait(*args, **kwargs):
+            probe.menu()
+            return SPACE
+
+        engine.Snake.update = snake_update
+        pygame.display.update = display_update
+        pygame.event.wait = event_wait
+
+    def ticked(self, snake, turned_from):
+        now = time.perf_counter()
+        self.snake = snake
+        self.ticks.append(now)
+        with self.lock:
+            press = self.press
+            if press and press.ticked is None and snake.direction == press.direction != turned_from:
+                press.ticked = now
+
+    def presented(self):
+        now = time.perf_counter()
+        self.frames.append(now)
+        with self.lock:
+            press = self.press
+            if press and press.ticked is not None:
+                self.presses.append((press.posted, press.ticked, now))
+                self.press = None
+        if len(self.presses) >= self.samples:
+            self.done.set()
+
+    def menu(self):
+        # A menu is drawn before the loop waits on it, so the frame just presented was the menu's: it and the
+        # intervals around it don't count, nor does a press it would have completed or that was still waiting.
+        self.menus += 1
+        if self.frames and self.frames[-1] is not None:
+            if self.presses and self.presses[-1][2] == self.frames[-1]:
+                self.presses.pop()
+            self.frames[-1] = None
+        self.ticks.append(None)
+        with self.lock:
+            self.press = None
+
+    def pick_direction(self):
+        snake = self.snake
+        options = TURNS[snake.direction]
+        free = [direction for direction in options if self.is_free(snake, direction)]
+        return self.rng.choice(free or options)
+
+    def is_free(self, snake, direction):
+        dx, dy = engine.MOVES[direction]
+        x, y = snake.x + dx, snake.y + dy
+        grid = snake.grid
+        return 0 <= x < grid.width and 0 <= y < grid.height and not grid.is_wall(x, y) and grid.count(x, y) == 0
+
+    def post_presses(self):
+        # One press at a time, each after a random part of two ticks, so presses land all over the tick.
+        while not self.done.is_set():
+            time.sleep(self.rng.uniform(0, 2 / engine.FPS))
+            if self.snake is None or self.press is not None:
+                continue
+            direction = self.pick_direction()
+            with self.lock:
+                self.press = Press(direction)
+            pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=DIRECTION_KEYS[direction]))
+
+
+def intervals(times):
+    return [later - earlier for earlier, later in zip(times, times[1:]) if earlier is not None and later is not None]
+
+
+def describe(name, values):
+    values = sorted(value * 1000 for value in values)
+    if not values:
+        return f"{name:<16} no samples"
+    percentile = lambda share: values[min(int(share * len(values)), len(values) - 1)]
+    return (f"{name:<16} mean {statistics.fmean(values):7.1f}  p50 {percentile(0.5):7.1f}  p95 {percentile(0.95):7.1f}"
+            f"  p99 {percentile(0.99):7.1f}  max {values[-1]:7.1f}  stdev {statistics.pstdev(values):6.1f} ms")
+
+
+class LatencyReport:
+    # The measured intervals of one run, in seconds.
+    def __init__(self, probe):
+        self.menus = probe.menus
+        self.latencies = [photon - posted for posted, _, photon in probe.presses]
+        self.to_tick = [ticked - posted for posted, ticked, _ in probe.presses]
+        self.to_photon = [photon - ticked for _, ticked, photon in probe.presses]
+        self.frame_times = intervals(probe.frames)
+        self.tick_times = intervals(probe.ticks)
+
+    def p95(self):
+        # The 95th percentile of the input-to-photon latency, None without presses.
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(int(0.95 * len(latencies)), len(latencies) - 1)]
+
+    def lines(self):
+        return [f"{len(self.latencies)} presses, {self.menus} menus",
+                describe("input to photon", self.latencies),
+                describe("input to tick", self.to_tick),
+                describe("tick to photon", self.to_photon),
+                describe("frame time", self.frame_times),
+                describe("tick time", self.tick_times)]
+
+
+class Finished(Exception):
+    pass
+
+
+def run(samples=SAMPLES, level=campaign.FIRST_LEVEL, timeout=TIMEOUT, seed=0):
+    # Plays main.py in this process until samples presses are measured or timeout seconds have passed, then
+    # unhooks everything and returns the LatencyReport. The session's scores and its replay go to a scratch
+    # directory, removed when the game's exit handlers have run.
+    scratch = tempfile.mkdtemp()
+    scores_path = scores.scores_path
+    scores.scores_path = os.path.join(scratch, "scores.sqlite3")
+    hooked = (engine.Snake.update, pygame.display.update, pygame.event.wait, pygame.event.get, atexit.register)
+    get_events = pygame.event.get
+    exit_handlers = []
+    probe = LatencyProbe(samples, random.Random(seed))
+    probe.install()
+    started = time.perf_counter()
+
+    def event_get(*args, **kwargs):
+        if probe.done.is_set() or time.perf_counter() - started > timeout:
+            raise Finished()
+        return get_events(*args, **kwargs)
+
+    def register(function, *args, **kwargs):
+        exit_handlers.append((function, args, kwargs))
+        return function
+
+    pygame.event.get = event_get
+    atexit.register = register
+    presses = threading.Thread(target=probe.post_presses, name="key-presses", daemon=True)
+    presses.start()
+    argv = sys.argv
+    sys.argv = [MAIN_PATH, str(level)]
+    try:
+        runpy.run_path(MAIN_PATH, run_name="__main__")
+    except Finished:
+        pass
+    finally:
+        sys.argv = argv
+        probe.done.set()
+        presses.join()
+        engine.Snake.update, pygame.display.update, pygame.event.wait, pygame.event.get, atexit.register = hooked
+        for function, args, kwargs in reversed(exit_handlers):
+            function.__globals__["replays_path"] = scratch
+            function(*args, **kwargs)
+        pygame.quit()
+        scores.scores_path = scores_path
+        shutil.rmtree(scratch, ignore_errors=True)
+    return LatencyReport(probe)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure the game loop's input-to-photon latency headless.")
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--level", type=int, default=campaign.FIRST_LEVEL)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="seconds to give up after")
+    parser.add_argument("--max-p95", type=float, help="fail when the 95th percentile of the latency is over this, in ms")
+    args = parser.parse_args()
+
+    report = run(args.samples, args.level, args.timeout, args.seed)
+    print("\n".join(report.lines()))
+    p95 = report.p95()
+    if args.max_p95 is not None and p95 is not None and p95 * 1000 > args.max_p95:
+        print(f"input to photon p95 {p95 * 1000:.1f} ms is over {args.max_p95:.1f} ms")
+        sys.exit(1)
@@ -0,0 +1,64 @@
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+import multiplayer
+
+# Collision resolution with SNAKES snakes and APPLES apples on large walled grids: a whole multiplayer.Arena tick,
+# resolved through engine.CollisionMap, against checking every head against every apple and every segment
+# of every snake on the same boards. The snakes turn at random now and then, and respawn when they die.
+SNAKES = 100
+APPLES = 1000
+GRIDS = ((256, 256), (1024, 1024))
+TICKS = 300
+TURN_CHANCE = 0.2
+
+
+def linear_collisions(arena, bodies, apples):
+    hits = 0
+    for player in arena.players.values():
+        if player.alive:
+            head = player.snake.head_cell()
+            for cell in apples:
+                if cell == head:
+                    hits += 1
+            for number, body in bodies.items():
+                for cell in body if number != player.number else body[:-1]:
+                    if cell == head:
+                        hits += 1
+    return hits
+
+
+def measure(width, height):
+    arena = multiplayer.Arena(multiplayer.arena_map(f"{width}x{height}"), seed=0, apples_number=APPLES)
+    for _ in range(SNAKES):
+        arena.add_player()
+    rng = random.Random(0)
+    step_time = linear_time = 0.0
+    collisions = 0
+    for _ in range(TICKS):
+        for player in arena.players.values():
+            if rng.random() < TURN_CHANCE:
+                player.directions.append(rng.randrange(4))
+        start = time.perf_counter()
+        collisions += len(arena.step())
+        step_time += time.perf_counter() - start
+
+        bodies = {player.number: [entry >> 4 for entry in player.snake.entries()]
+                  for player in arena.players.values() if player.alive}
+        apples = list(arena.grid.apples)
+        start = time.perf_counter()
+        linear_collisions(arena, bodies, apples)
+        linear_time += time.perf_counter() - start
+        arena.touched.clear()
+    return step_time / TICKS * 1e6, linear_time / TICKS * 1e6, collisions / TICKS
+
+
+if __name__ == "__main__":
+    print(f"{SNAKES} snakes, {APPLES} apples, {TICKS} ticks")
+    print(f"{'grid':>10} {'arena tick us':>14} {'linear scan us':>15} {'collisions/tick':>16}")
+    for width, height in GRIDS:
+        step, linear, collisions = measure(width, height)
+        print(f"{width:>4}x{height:<5} {step:14.0f} {linear:15.0f} {collisions:16.2f}")
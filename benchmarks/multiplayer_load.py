@@ -0,0 +1,50 @@
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+from engine import FPS
+import multiplayer
+
+# The multiplayer server under load from loopback bot clients, as players and rooms grow. Rooms tick as fast as
+# they can (TICK_RATE is far above what they reach), and the clients share the server's event loop and CPU.
+# Bandwidth is what each client receives per tick, and per second at the game's normal tick rate.
+PLAYERS = (1, 8, 32, 128)
+ROOM_SIZE = 8
+TICK_RATE = 10000
+SECONDS = 3
+
+
+async def measure(players):
+    server = multiplayer.Server(multiplayer.arena_map("64x36"), TICK_RATE, ROOM_SIZE, seed=0)
+    tcp_server = await server.start()
+    port = tcp_server.sockets[0].getsockname()[1]
+    clients = [multiplayer.Client() for _ in range(players)]
+    for client in clients:
+        await client.connect("127.0.0.1", port)
+    tasks = [asyncio.create_task(client.play(multiplayer.wandering_policy, random.Random(number)))
+             for number, client in enumerate(clients)]
+    start = time.perf_counter()
+    ticks = [room.arena.ticks for room in server.rooms]
+    received = sum(client.received_bytes for client in clients)
+    snapshots = sum(client.snapshots for client in clients)
+    await asyncio.sleep(SECONDS)
+    elapsed = time.perf_counter() - start
+    ticks = sum(room.arena.ticks for room in server.rooms) - sum(ticks)
+    received = sum(client.received_bytes for client in clients) - received
+    snapshots = sum(client.snapshots for client in clients) - snapshots
+    for client in clients:
+        client.close()
+    await asyncio.gather(*tasks)
+    tcp_server.close()
+    await tcp_server.wait_closed()
+    return len(server.rooms), ticks / elapsed / len(server.rooms), received / snapshots
+
+
+if __name__ == "__main__":
+    print(f"{'players':>7} {'rooms':>6} {'ticks/s/room':>13} {'bytes/tick':>11} {f'KB/s @ {FPS} Hz':>12}")
+    for players in PLAYERS:
+        rooms, tick_rate, per_tick = asyncio.run(measure(players))
+        print(f"{players:>7} {rooms:>6} {tick_rate:>13.0f} {per_tick:>11.1f} {per_tick * FPS / 1024:>12.2f}")
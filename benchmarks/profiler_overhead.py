@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+import campaign
+import engine
+from profiler import profiler
+
+# Cost of a headless game tick with the game's hot paths instrumented, while the profiler is off and while it is on.
+# Off, a phase costs one call and a no-op context manager, and the instrumented methods are not wrapped at all.
+TICKS = 200000
+ROUNDS = 5
+
+
+def play(timed):
+    game = engine.Game(campaign.build_levels(), 1, seed=0)
+    moves = [(engine.UP, engine.RIGHT, engine.DOWN, engine.LEFT)[tick % 4] if tick % 5 == 0 else None
+             for tick in range(TICKS)]
+    start = time.perf_counter()
+    if timed:
+        for move in moves:
+            with profiler.phase("game.step"):
+                game.step(move)
+    else:
+        for move in moves:
+            game.step(move)
+    return (time.perf_counter() - start) / TICKS * 1e6
+
+
+if __name__ == "__main__":
+    baseline = min(play(False) for _ in range(ROUNDS))
+    profiler.instrument(engine.Snake, "update")
+    profiler.instrument(engine.CollisionMap, "hit")
+    profiler.instrument(engine.Level, "spawn_apples")
+    disabled = min(play(True) for _ in range(ROUNDS))
+    profiler.enable()
+    enabled = min(play(True) for _ in range(ROUNDS))
+    profiler.disable()
+    print(f"not instrumented: {baseline:.2f} us/tick")
+    print(f"profiler off:     {disabled:.2f} us/tick ({disabled / baseline - 1:+.1%})")
+    print(f"profiler on:      {enabled:.2f} us/tick ({enabled / baseline - 1:+.1%})")
+    for name, (p50, p99, count) in sorted(profiler.percentiles().items()):
+        print(f"  {name:<20} p50 {p50 * 1000:7.2f} us  p99 {p99 * 1000:7.2f} us  ({count} kept)")
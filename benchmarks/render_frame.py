@@ -0,0 +1,46 @@
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+source_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source')
+sys.path.insert(0, source_path)
+os.chdir(source_path)
+import pygame
+import campaign
+import engine
+import main
+
+# Per-frame render cost of a full redraw against the cached background with dirty rects, on the real level 1.
+TICKS = 2000
+
+
+def play(redraw):
+    random.seed(0)
+    level = main.Level(1, campaign.level_map("map_1"), 8, 1, 0, -1)
+    game = engine.Game({1: level})
+    level.draw()
+    elapsed = 0.0
+    for _ in range(TICKS):
+        game.step(random.choice((None, None, None, engine.UP, engine.DOWN, engine.LEFT, engine.RIGHT)))
+        start = time.perf_counter()
+        if redraw:
+            pygame.display.update(level.redraw())
+        else:
+            level.draw()
+            pygame.display.update()
+        elapsed += time.perf_counter() - start
+    return elapsed / TICKS * 1000, pygame.image.tobytes(main.window, "RGB")
+
+
+if __name__ == "__main__":
+    pygame.init()
+    main.window = pygame.display.set_mode((main.WINDOW_WIDTH, main.WINDOW_HEIGHT))
+    main.atlas.load()
+    full, full_frame = play(False)
+    dirty, dirty_frame = play(True)
+    print(f"full redraw: {full:.3f} ms/frame")
+    print(f"dirty rects: {dirty:.3f} ms/frame ({full / dirty:.1f}x)")
+    print("last frames identical:", full_frame == dirty_frame)
@@ -0,0 +1,49 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source'))
+from scores import INSERT_RUN, ScoreStore
+
+# The score store with millions of recorded runs: how long the game is held up by recording a run, how fast the
+# writer thread gets through a burst of them, and how long a top-10 leaderboard query takes as the table grows.
+RUNS = (10000, 1000000, 3000000)
+LEVELS = 6
+QUERIES = 1000
+BURST = 20000
+
+
+def fill(store, count, rng):
+    rows = [("bench", rng.randrange(LEVELS), int(rng.expovariate(1 / 30)), rng.randrange(5000), "hit_wall", 0, 0.0)
+            for _ in range(count)]
+    with store.reader:
+        store.reader.executemany(INSERT_RUN, rows)
+
+
+def query_time(store):
+    start = time.perf_counter()
+    for query in range(QUERIES):
+        store.top(query % LEVELS, 10)
+    return (time.perf_counter() - start) / QUERIES * 1e6
+
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        store = ScoreStore(os.path.join(directory, "scores.sqlite3"))
+        recorded = 0
+        for runs in RUNS:
+            fill(store, runs - recorded, rng)
+            recorded = runs
+            print(f"{runs:>8} runs: top 10 in {query_time(store):6.1f} us")
+
+        start = time.perf_counter()
+        for run in range(BURST):
+            store.record_run(run % LEVELS, run, run, "hit_wall", 0)
+        queued = time.perf_counter() - start
+        store.close()
+        written = time.perf_counter() - start
+        print(f"record_run: {queued / BURST * 1e6:.2f} us per call on the game's thread, "
+              f"{BURST / written:.0f} runs/s written by the writer thread")
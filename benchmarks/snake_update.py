@@ -0,0 +1,37 @@
+import sys
+import time
+
+from boards import lay_snake
+import engine
+
+# Cost of one Snake.update() at different snake lengths on a large board, and the objects it leaves allocated per tick.
+LENGTHS = (10, 1000, 100000)
+BOARD = 512
+TICKS = 20000
+
+
+def measure(length):
+    grid = engine.Grid(BOARD, BOARD)
+    snake = engine.Snake(1, 2, grid)
+    directions = lay_snake(snake, BOARD, BOARD, length)[:TICKS]
+    update = snake.update
+    start = time.perf_counter()
+    for direction in directions:
+        update(direction)
+    elapsed = time.perf_counter() - start
+
+    directions = directions[:len(directions) // 2]
+    snake.restart(1, 2)
+    lay_snake(snake, BOARD, BOARD, length)
+    before = sys.getallocatedblocks()
+    for direction in directions:
+        update(direction)
+    kept = sys.getallocatedblocks() - before
+    return elapsed / TICKS * 1e9, kept / len(directions)
+
+
+if __name__ == "__main__":
+    print(f"{'length':>8} {'ns/update':>10} {'blocks kept/tick':>17}")
+    for length in LENGTHS:
+        nanoseconds, kept = measure(length)
+        print(f"{length:>8} {nanoseconds:>10.0f} {kept:>17.3f}")
@@ -0,0 +1,66 @@
+import random
+import time
+
+from boards import lay_snake
+import engine
+from maps import walled_map
+
+# Apple spawning and head collision on increasingly full boards: the engine.Grid free-cell list against
+# the previous rejection sampling and linear segment scans. Rejection sampling gives up after
+# REJECTION_LIMIT attempts, where it used to loop forever.
+REPEATS = 200
+REJECTION_LIMIT = 10000
+BOARDS = ((16, 9), (64, 64), (256, 256))
+FILLS = (0.1, 0.5, 0.9, 0.99, 1.0)
+
+
+def rejection_randomize(level, body):
+    for _ in range(REJECTION_LIMIT):
+        x = random.randint(0, level.width - 1)
+        y = random.randint(0, level.height - 1)
+        respawn = False
+        for seg_x, seg_y in body:
+            if x == seg_x and y == seg_y:
+                respawn = True
+        if level.map.is_wall(x, y):
+            respawn = True
+        if not respawn:
+            return x, y
+    return None
+
+
+def linear_collision(level, body):
+    for seg_x, seg_y in body[:-1]:
+        if level.snake.x == seg_x and level.snake.y == seg_y:
+            return True
+    return False
+
+
+def timed(function, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = function()
+    return (time.perf_counter() - start) / repeats * 1e6, result
+
+
+if __name__ == "__main__":
+    print(f"{'board':>9} {'length':>7} {'rejection us':>13} {'free list us':>13} {'scan us':>10} {'lookup us':>10}")
+    for width, height in BOARDS:
+        level = engine.Level(1, walled_map(width, height), score_to_level_up=-1)
+        for apple in level.apples:
+            level.grid.release(apple.x, apple.y)
+        level.apples.clear()
+        level.grid.apples.clear()
+        interior = (width - 2) * (height - 2)
+        for fill in FILLS:
+            length = max(int(interior * fill), 2)
+            lay_snake(level.snake, width, height, length)
+            body = [(x, y) for x, y, _, _, _ in level.snake.parts()]
+            repeats = REPEATS if length < 10000 else 10
+            old, found = timed(lambda: rejection_randomize(level, body), 1 if fill >= 0.99 else repeats)
+            new, _ = timed(lambda: level.grid.is_full() or level.grid.random_free(), repeats)
+            scan, _ = timed(lambda: linear_collision(level, body), repeats)
+            snake = level.snake
+            lookup, _ = timed(lambda: level.grid.hit(engine.PLAYER, snake.x, snake.y, snake.tail_cell()), repeats)
+            old_text = f"{old:13.1f}" if found else f"{'gave up':>13}"
+            print(f"{width:>4}x{height:<4} {length:>7} {old_text} {new:>13.2f} {scan:>10.1f} {lookup:>10.2f}")
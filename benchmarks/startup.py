@@ -0,0 +1,55 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Time from process start to the first title-screen frame and to the first game frame, plus peak resident
+# memory, for `python main.py` with SDL's dummy drivers. The title menu is dismissed right after its first frame.
+# The session's scores go to a scratch database, removed before the runner exits.
+REPEATS = 5
+MAIN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source', 'main.py')
+RUNNER = '''
+import json, os, resource, runpy, shutil, sys, tempfile, time
+import pygame
+main_path = sys.argv.pop(1)
+sys.path.insert(0, os.path.dirname(main_path))
+import scores
+scratch = tempfile.mkdtemp()
+scores.scores_path = os.path.join(scratch, "scores.sqlite3")
+frames = []
+original_update = pygame.display.update
+
+
+def update(*args):
+    original_update(*args)
+    frames.append(time.time())
+    if len(frames) == 2:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print(json.dumps({"title": frames[0], "game": frames[1], "rss_kb": rss}))
+        sys.stdout.flush()
+        shutil.rmtree(scratch, ignore_errors=True)
+        os._exit(0)
+    pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_SPACE))
+
+
+pygame.display.update = update
+runpy.run_path(main_path, run_name="__main__")
+'''
+
+
+def run_once():
+    environment = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy", PYGAME_HIDE_SUPPORT_PROMPT="1")
+    start = time.time()
+    output = subprocess.run([sys.executable, "-c", RUNNER, MAIN_PATH], env=environment, cwd="/",
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    return (result["title"] - start) * 1000, (result["game"] - start) * 1000, result["rss_kb"] / 1024
+
+
+if __name__ == "__main__":
+    runs = [run_once() for _ in range(REPEATS)]
+    print(f"time to title frame: {statistics.median(run[0] for run in runs):7.1f} ms")
+    print(f"time to game frame:  {statistics.median(run[1] for run in runs):7.1f} ms")
+    print(f"peak resident memory: {statistics.median(run[2] for run in runs):6.1f} MB")
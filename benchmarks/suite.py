@@ -0,0 +1,201 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+source_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'source')
+sys.path.insert(0, source_path)
+os.chdir(source_path)
+import pygame
+from boards import lay_snake
+import campaign
+import engine
+import main
+from maps import walled_map
+
+# The regression suite: the engine, spawning, rendering and menu hot paths, each timed over SAMPLES samples after a
+# warm-up with the garbage collector off, and reported as the median and the spread between the quartiles.
+# A case regresses when both its median and its fastest sample are more than --threshold slower than in
+# baselines.json; a slower median alone is more often another process on the machine than the code.
+#
+#   python suite.py                 compare with the baselines
+#   python suite.py --save          record new baselines (after a deliberate change, or on a new machine)
+#   python suite.py --only render   run the cases whose names contain "render"
+#
+# The baselines only mean something on the machine they were recorded on, so they are stored with a description of it.
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+SAMPLES = 15
+WARMUP = 2
+THRESHOLD = 0.25
+BOARD = 512
+MOVES = (None, None, None, engine.UP, engine.DOWN, engine.LEFT, engine.RIGHT)
+
+
+def snake_update(length, ticks=10000):
+    # One sample: ticks updates of a snake laid out length long on a BOARD x BOARD board.
+    snake = engine.Snake(1, 2, engine.Grid(BOARD, BOARD))
+    directions = lay_snake(snake, BOARD, BOARD, length)[:ticks]
+    update = snake.update
+    start = time.perf_counter()
+    for direction in directions:
+        update(direction)
+    return time.perf_counter() - start, len(directions)
+
+
+def apple_randomize(fill, spawns=5000):
+    # One sample: spawns apples on a 64 x 64 map with fill of its free cells taken, each released before the next.
+    level = engine.Level(1, walled_map(64, 64), score_to_level_up=-1)
+    level.random = random.Random(0)
+    grid = level.grid
+    for _ in range(int(len(grid.free) * fill)):
+        grid.occupy(*grid.random_free(level.random))
+    apple = engine.Apple(level)
+    start = time.perf_counter()
+    for _ in range(spawns):
+        apple.randomize()
+        grid.release(apple.x, apple.y)
+    return time.perf_counter() - start, spawns
+
+
+def render_level(frames, redraw):
+    # One sample: frames of level 1 as the snake wanders, redrawn in full (the level's background, apples, snake
+    # and labels) or only where something changed.
+    level = main.Level(1, campaign.level_map("map_1"), 8, 1, 0, -1)
+    game = engine.Game({1: level}, seed=0)
+    rng = random.Random(0)
+    level.render_background()
+    level.draw()
+    elapsed = 0.0
+    for _ in range(frames):
+        game.step(rng.choice(MOVES))
+        start = time.perf_counter()
+        if redraw:
+            level.redraw()
+        else:
+            level.draw()
+        elapsed += time.perf_counter() - start
+    return elapsed, frames
+
+
+def render_background(frames=20):
+    level = main.Level(1, campaign.level_map("map_1"), 8, 1, 0, -1)
+    start = time.perf_counter()
+    for _ in range(frames):
+        level.render_background()
+    return time.perf_counter() - start, frames
+
+
+def menu_open(frames=100):
+    # One sample: frames menus opened over the game, which renders the darkened backdrop and its text once.
+    start = time.perf_counter()
+    for _ in range(frames):
+        main.MenuScreen("Paused!", "", "Resume!", "Exit the game!").draw(main.window)
+    return time.perf_counter() - start, frames
+
+
+def menu_hover(frames=2000):
+    # One sample: frames of an open menu with the mouse moving between its buttons.
+    screen = main.MenuScreen("Paused!", "", "Resume!", "Exit the game!")
+    screen.draw(main.window)
+    positions = [rect.center for rect, *_ in screen.buttons]
+    start = time.perf_counter()
+    for frame in range(frames):
+        screen.handle(pygame.event.Event(pygame.MOUSEMOTION, pos=positions[frame % 2]))
+        screen.draw(main.window)
+    return time.perf_counter() - start, frames
+
+
+CASES = {
+    "snake_update[10]": lambda: snake_update(10),
+    "snake_update[1000]": lambda: snake_update(1000),
+    "snake_update[100000]": lambda: snake_update(100000),
+    "apple_randomize[0%]": lambda: apple_randomize(0.0),
+    "apple_randomize[50%]": lambda: apple_randomize(0.5),
+    "apple_randomize[90%]": lambda: apple_randomize(0.9),
+    "apple_randomize[99%]": lambda: apple_randomize(0.99),
+    "render_background": render_background,
+    "render_full_frame": lambda: render_level(300, False),
+    "render_dirty_frame": lambda: render_level(300, True),
+    "menu_open": menu_open,
+    "menu_hover": menu_hover,
+}
+
+
+def measure(case, samples):
+    for _ in range(WARMUP):
+        case()
+    times = []
+    gc.disable()
+    try:
+        for _ in range(samples):
+            elapsed, operations = case()
+            times.append(elapsed / operations * 1e6)
+    finally:
+        gc.enable()
+    quartiles = statistics.quantiles(times, n=4)
+    return {"median_us": statistics.median(times), "min_us": min(times), "iqr_us": quartiles[2] - quartiles[0]}
+
+
+def machine():
+    return {"platform": platform.platform(), "processor": platform.processor() or platform.machine(),
+            "python": platform.python_version(), "pygame": pygame.version.ver}
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Time the game's hot paths and compare them with the baselines.")
+    parser.add_argument("--save", action="store_true", help="record the results as the new baselines")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="slowdown that fails the run, 0.25 = 25%%")
+    parser.add_argument("--samples", type=int, default=SAMPLES)
+    parser.add_argument("--only", default="", help="run only the cases whose names contain this")
+    args = parser.parse_args()
+
+    pygame.init()
+    main.window = pygame.display.set_mode((main.WINDOW_WIDTH, main.WINDOW_HEIGHT))
+    main.atlas.load()
+    main.load_fonts()
+
+    baselines = {}
+    if os.path.exists(BASELINES_PATH):
+        with open(BASELINES_PATH) as file:
+            baselines = json.load(file)
+        if not args.save and baselines.get("machine") != machine():
+            print(f"warning: the baselines were recorded on {baselines.get('machine')}, not this machine")
+
+    results = {}
+    regressions = []
+    print(f"{'case':<24} {'median us':>11} {'min us':>11} {'iqr us':>9} {'baseline':>11} {'change':>8}")
+    for name, case in CASES.items():
+        if args.only not in name:
+            continue
+        result = results[name] = measure(case, args.samples)
+        baseline = baselines.get("cases", {}).get(name)
+        line = f"{name:<24} {result['median_us']:>11.3f} {result['min_us']:>11.3f} {result['iqr_us']:>9.3f}"
+        if baseline and not args.save:
+            change = min(result["median_us"] / baseline["median_us"], result["min_us"] / baseline["min_us"]) - 1
+            line += f" {baseline['median_us']:>11.3f} {change:>+8.1%}"
+            if change > args.threshold:
+                regressions.append(name)
+                line += "  REGRESSION"
+        print(line)
+
+    if args.save:
+        cases = baselines.get("cases", {}) if baselines.get("machine") == machine() else {}
+        cases.update(results)
+        with open(BASELINES_PATH, "w") as file:
+            json.dump({"machine": machine(), "samples": args.samples, "cases": cases}, file, indent=1)
+        print(f"saved {len(results)} baselines to {BASELINES_PATH}")
+    elif regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    run()
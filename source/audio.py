@@ -0,0 +1,115 @@
+import os
+import threading
+
+import pygame
+
+# Sound effects are decoded once each, on demand or ahead of time in a background thread, and played on a pool of
+# reserved mixer channels. When the pool is busy a new effect takes the channel of the oldest effect with the
+# lowest priority no higher than its own, or is dropped if there is none; an effect limited to a number of voices
+# takes back its own oldest channel instead, so a burst of apples never piles up or cuts off a jingle.
+# Level music is streamed from disk by pygame.mixer.music: one track at a time, faded out before the next fades in.
+
+CHANNELS = 8
+FADE_MS = 600
+
+
+class SoundBank:
+    def __init__(self, paths, priorities=None, voices=None, channels=CHANNELS):
+        self.paths = paths
+        self.priorities = priorities or {}
+        self.voices = voices or {}
+        self.channel_count = channels
+        self.sounds = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.channels = None
+        # What every channel of the pool last played: [name, priority, play order].
+        self.playing = []
+        self.plays = 0
+
+    def preload(self):
+        self.thread = threading.Thread(target=self.load_all, name="sound-preload", daemon=True)
+        self.thread.start()
+
+    def load_all(self):
+        for name in self.paths:
+            self.get(name)
+
+    def is_loaded(self):
+        return len(self.sounds) == len(self.paths)
+
+    def get(self, name):
+        with self.lock:
+            if name not in self.sounds:
+                self.sounds[name] = pygame.mixer.Sound(self.paths[name])
+            return self.sounds[name]
+
+    def open_channels(self):
+        # Reserved channels are never picked by a bare Sound.play(), so nothing else in the game can take them.
+        if pygame.mixer.get_num_channels() < self.channel_count:
+            pygame.mixer.set_num_channels(self.channel_count)
+        pygame.mixer.set_reserved(self.channel_count)
+        self.channels = [pygame.mixer.Channel(index) for index in range(self.channel_count)]
+        self.playing = [[None, 0, 0] for _ in self.channels]
+
+    def pick_channel(self, name, priority):
+        busy = [index for index, channel in enumerate(self.channels) if channel.get_busy()]
+        own = [index for index in busy if self.playing[index][0] == name]
+        if name in self.voices and len(own) >= self.voices[name]:
+            return min(own, key=lambda index: self.playing[index][2])
+        if len(busy) < len(self.channels):
+            return next(index for index, channel in enumerate(self.channels) if not channel.get_busy())
+        stealable = [index for index in busy if self.playing[index][1] <= priority]
+        if stealable:
+            return min(stealable, key=lambda index: (self.playing[index][1], self.playing[index][2]))
+        return None
+
+    def play(self, name, volume):
+        if self.channels is None:
+            self.open_channels()
+        priority = self.priorities.get(name, 0)
+        index = self.pick_channel(name, priority)
+        if index is None:
+            return None
+        channel = self.channels[index]
+        channel.stop()
+        channel.set_volume(volume)
+        channel.play(self.get(name))
+        self.plays += 1
+        self.playing[index] = [name, priority, self.plays]
+        return channel
+
+
+class Music:
+    # Asking for the track that is already playing only changes its volume. Asking for another fades the current one
+    # out, and update(), called every frame, starts the new one fading in once the old one is silent.
+    def __init__(self, fade_ms=FADE_MS):
+        self.fade_ms = fade_ms
+        self.path = None
+        self.pending = None
+
+    def play(self, path, volume, fallback=None):
+        if not os.path.exists(path) and fallback:
+            path = fallback
+        if path == self.path and self.pending is None and pygame.mixer.music.get_busy():
+            pygame.mixer.music.set_volume(volume)
+            return
+        if self.pending is None and pygame.mixer.music.get_busy():
+            pygame.mixer.music.fadeout(self.fade_ms)
+        self.pending = (path, volume)
+        self.path = path
+        self.update()
+
+    def fade_out(self):
+        if self.pending is None and pygame.mixer.music.get_busy():
+            pygame.mixer.music.fadeout(self.fade_ms)
+        self.pending = None
+        self.path = None
+
+    def update(self):
+        if self.pending and not pygame.mixer.music.get_busy():
+            path, volume = self.pending
+            self.pending = None
+            pygame.mixer.music.load(path)
+            pygame.mixer.music.set_volume(volume)
+            pygame.mixer.music.play(fade_ms=self.fade_ms)
@@ -0,0 +1,196 @@
+import numpy as np
+
+import engine
+
+# Many games of one level stepped together on NumPy arrays. The rules follow engine.Level.step,
+# engine.Snake.update and the level's apple effects; every finished game restarts its level on the spot.
+
+# ACTIONS
+NO_ACTION = -1
+ACTIONS = (engine.UP, engine.DOWN, engine.LEFT, engine.RIGHT)
+DX = np.array([engine.MOVES[action][0] for action in ACTIONS], dtype=np.int32)
+DY = np.array([engine.MOVES[action][1] for action in ACTIONS], dtype=np.int32)
+OPPOSITE_ACTION = np.array([engine.OPPOSITE[action] for action in ACTIONS], dtype=np.int8)
+
+# APPLE KINDS
+APPLE = 0
+GOLDEN_APPLE = 1
+SHRINKING_APPLE = 2
+WITHERED_APPLE = 3
+APPLE_KINDS = {"apple": APPLE, "golden": GOLDEN_APPLE, "shrinking": SHRINKING_APPLE, "withered": WITHERED_APPLE}
+
+# CAUSES
+ALIVE = 0
+HIT_WALL = 1
+BIT_TAIL = 2
+BIT_SELF = 3
+LEVEL_UP = 4
+
+
+def wall_grid(level):
+    return np.array([[level.is_wall(x, y) for x in range(level.width)] for y in range(level.height)], dtype=bool)
+
+
+class BatchGame:
+    def __init__(self, level, n, seed=None):
+        self.n = n
+        self.width = level.width
+        self.height = level.height
+        self.walls = wall_grid(level)
+        self.snake_x = level.snake_x
+        self.snake_y = level.snake_y
+        self.score_to_level_up = level.score_to_level_up
+        if set(level.apple_weights) - set(APPLE_KINDS):
+            raise ValueError(f"BatchGame only plays the apple types {', '.join(APPLE_KINDS)}")
+        self.apple_kinds = np.array([APPLE_KINDS[name] for name in level.apple_weights], dtype=np.int8)
+        self.apple_cumulative_weights = np.array(level.apple_cumulative_weights) / level.apple_cumulative_weights[-1]
+        # The effects by kind; a withered apple's points are taken away.
+        effects = [level.apple_effects[name] for name in APPLE_KINDS]
+        self.effects = {field: np.array([effect[field] for effect in effects], dtype=np.int64)
+                        for field in engine.EFFECT_FIELDS}
+        self.effects["sign"] = np.array([-1 if kind == WITHERED_APPLE else 1 for kind in APPLE_KINDS.values()])
+        self.apples_number = max(int(level.apples_number), 1)
+        self.apples_timer = level.ticks(level.apples_timer)
+        self.rng = np.random.default_rng(seed)
+
+        self.capacity = self.width * self.height + 2
+        self.index = np.arange(n)
+        self.occupancy = np.zeros((n, self.height, self.width), dtype=np.int16)
+        self.body_x = np.zeros((n, self.capacity), dtype=np.int32)
+        self.body_y = np.zeros((n, self.capacity), dtype=np.int32)
+        self.head_ptr = np.zeros(n, dtype=np.int64)
+        self.tail_ptr = np.zeros(n, dtype=np.int64)
+        self.length = np.zeros(n, dtype=np.int64)
+        self.direction = np.zeros(n, dtype=np.int8)
+        self.grow_count = np.zeros(n, dtype=np.int64)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.apples_clock = np.zeros(n, dtype=np.int64)
+        self.apple_x = np.zeros((n, self.apples_number), dtype=np.int32)
+        self.apple_y = np.zeros((n, self.apples_number), dtype=np.int32)
+        self.apple_kind = np.zeros((n, self.apples_number), dtype=np.int8)
+        self.apple_active = np.zeros((n, self.apples_number), dtype=bool)
+        self.ticks = np.zeros(n, dtype=np.int64)
+        self.reset()
+
+    @property
+    def head_x(self):
+        return self.body_x[self.index, self.head_ptr]
+
+    @property
+    def head_y(self):
+        return self.body_y[self.index, self.head_ptr]
+
+    def reset(self, mask=None):
+        if mask is None:
+            mask = np.ones(self.n, dtype=bool)
+        if not mask.any():
+            return
+        self.occupancy[mask] = 0
+        self.tail_ptr[mask] = 0
+        self.head_ptr[mask] = 1
+        self.length[mask] = 2
+        self.body_x[mask, 0] = self.snake_x
+        self.body_y[mask, 0] = self.snake_y - 1
+        self.body_x[mask, 1] = self.snake_x
+        self.body_y[mask, 1] = self.snake_y
+        self.occupancy[mask, self.snake_y - 1, self.snake_x] += 1
+        self.occupancy[mask, self.snake_y, self.snake_x] += 1
+        self.direction[mask] = engine.DOWN
+        self.grow_count[mask] = 0
+        self.score[mask] = 0
+        self.ticks[mask] = 0
+        self.spawn_apples(mask)
+
+    def spawn_apples(self, mask):
+        games = np.flatnonzero(mask)
+        count = len(games)
+        self.apples_clock[games] = 0
+        number = self.rng.integers(1, self.apples_number + 1, size=count)
+        self.apple_active[games] = np.arange(self.apples_number) < number[:, None]
+
+        rolls = self.rng.random((count, self.apples_number))
+        self.apple_kind[games] = self.apple_kinds[np.searchsorted(self.apple_cumulative_weights, rolls, side="right")]
+
+        # Like engine.Grid.random_free, every apple takes a uniformly drawn free cell of its game: the free cells
+        # of all the games are listed in order, so a game's draw below its count of free cells indexes its run.
+        cells = self.width * self.height
+        free = (~self.walls & (self.occupancy[games] == 0)).reshape(count, cells)
+        rows = np.arange(count)
+        for slot in range(self.apples_number):
+            totals = np.count_nonzero(free, axis=1)
+            active = self.apple_active[games, slot] & (totals > 0)
+            self.apple_active[games, slot] = active
+            if not active.any():
+                continue
+            starts = np.cumsum(totals) - totals
+            draws = self.rng.integers(0, totals[active])
+            cell = np.flatnonzero(free)[starts[active] + draws] - rows[active] * cells
+            self.apple_x[games[active], slot] = cell % self.width
+            self.apple_y[games[active], slot] = cell // self.width
+            free[rows[active], cell] = False
+
+    def eat_effect(self, games, kind):
+        effects = self.effects
+        points = self.rng.integers(effects["min_points"][kind], effects["max_points"][kind] + 1)
+        points *= self.rng.integers(effects["min_multiplier"][kind], effects["max_multiplier"][kind] + 1)
+        self.score[games] = np.maximum(self.score[games] + effects["sign"][kind] * points, 0)
+        self.grow_count[games] += effects["grow"][kind]
+
+    def step(self, actions):
+        actions = np.asarray(actions, dtype=np.int8)
+        index = self.index
+        turn = (actions >= 0) & (actions != OPPOSITE_ACTION[self.direction])
+        self.direction = np.where(turn, actions, self.direction)
+
+        head_x = self.body_x[index, self.head_ptr] + DX[self.direction]
+        head_y = self.body_y[index, self.head_ptr] + DY[self.direction]
+        outside = (head_x < 0) | (head_x >= self.width) | (head_y < 0) | (head_y >= self.height)
+        head_x = np.clip(head_x, 0, self.width - 1)
+        head_y = np.clip(head_y, 0, self.height - 1)
+        self.head_ptr = (self.head_ptr + 1) % self.capacity
+        self.body_x[index, self.head_ptr] = head_x
+        self.body_y[index, self.head_ptr] = head_y
+        self.occupancy[index, head_y, head_x] += 1
+
+        growing = self.grow_count > 0
+        shrinking = self.grow_count < 0
+        pops = np.where(growing, 0, np.where(shrinking, np.where(self.length > 3, 2, 0), 1))
+        self.grow_count -= growing
+        self.grow_count += shrinking
+        for k in range(2):
+            popping = np.flatnonzero(pops > k)
+            tail = self.tail_ptr[popping]
+            self.occupancy[popping, self.body_y[popping, tail], self.body_x[popping, tail]] -= 1
+            self.tail_ptr[popping] = (tail + 1) % self.capacity
+        self.length += 1 - pops
+
+        previous_score = self.score.copy()
+        eaten = self.apple_active & (self.apple_x == head_x[:, None]) & (self.apple_y == head_y[:, None])
+        eaters = np.flatnonzero(eaten.any(axis=1))
+        if len(eaters):
+            self.eat_effect(eaters, self.apple_kind[eaters, eaten[eaters].argmax(axis=1)])
+            mask = np.zeros(self.n, dtype=bool)
+            mask[eaters] = True
+            self.spawn_apples(mask)
+
+        expired = self.apples_clock >= self.apples_timer
+        if expired.any():
+            self.spawn_apples(expired)
+
+        tail_x = self.body_x[index, self.tail_ptr]
+        tail_y = self.body_y[index, self.tail_ptr]
+        bitten = self.occupancy[index, head_y, head_x] > 1
+        on_tail = (head_x == tail_x) & (head_y == tail_y)
+        cause = np.zeros(self.n, dtype=np.int8)
+        cause[bitten & on_tail] = BIT_SELF
+        cause[bitten & (~on_tail | (self.occupancy[index, head_y, head_x] > 2))] = BIT_TAIL
+        cause[outside | self.walls[head_y, head_x]] = HIT_WALL
+        if self.score_to_level_up > 0:
+            cause[(cause == ALIVE) & (self.score >= self.score_to_level_up)] = LEVEL_UP
+        self.apples_clock += 1
+        self.ticks += 1
+
+        reward = self.score - previous_score
+        done = cause != ALIVE
+        self.reset(done)
+        return reward, done, cause
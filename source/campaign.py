@@ -0,0 +1,101 @@
+import json
+import os
+from collections.abc import Mapping
+
+import engine
+from maps import load_map
+
+# The campaign's levels as plain settings, read from levels/campaign.json, so the game, the balance sweeps and the
+# tools all build the same levels. Every entry names its map file in levels/, the level to go to after it
+# (none for the last one), the weights of the apple types it spawns (names from engine.APPLE_TYPES), the apple
+# effects that differ from its Level class's defaults (fields from engine.EFFECT_FIELDS), and any other keyword
+# arguments of its Level class. A game starts on first_level and starts over there after a game over, and the
+# arcade_level entry, built as an arcade level, is where it goes after the last level.
+
+levels_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'levels')
+campaign_path = os.path.join(levels_path, 'campaign.json')
+
+
+def load_campaign(path):
+    with open(path) as file:
+        config = json.load(file)
+    levels = {}
+    for key, settings in config["levels"].items():
+        if "map" not in settings:
+            raise ValueError(f"{path}: level {key} has no map")
+        for name in settings.get("apples", {}):
+            if name not in engine.APPLE_TYPES:
+                raise ValueError(f"{path}: level {key}: unknown apple type {name!r}")
+        try:
+            engine.merge_apple_effects({}, settings.get("apple_effects"))
+        except ValueError as error:
+            raise ValueError(f"{path}: level {key}: {error}") from None
+        levels[int(key)] = settings
+    for key, settings in levels.items():
+        if settings.get("next_level") is not None and settings["next_level"] not in levels:
+            raise ValueError(f"{path}: level {key}: next level {settings['next_level']} is not in the campaign")
+    for name in ("first_level", "arcade_level"):
+        if config.get(name) not in levels:
+            raise ValueError(f"{path}: {name} {config.get(name)} is not in the campaign")
+    return levels, config["first_level"], config["arcade_level"]
+
+
+LEVELS, FIRST_LEVEL, ARCADE_LEVEL = load_campaign(campaign_path)
+
+
+def level_map(name, sprite_names=None):
+    return load_map(os.path.join(levels_path, name + ".txt"), sprite_names)
+
+
+def build_level(level_number, start_points=0, level_class=engine.Level, arcade_class=engine.ArcadeLevel,
+                sprite_names=None, **overrides):
+    # An override named apples.NAME sets the weight of one apple type, and one named effects.NAME.FIELD one field
+    # of an apple type's effect, e.g. for sweeps.
+    settings = dict(LEVELS[level_number])
+    apple_weights = dict(settings.pop("apples", engine.DEFAULT_APPLE_WEIGHTS))
+    apple_effects = {name: dict(effect) for name, effect in settings.pop("apple_effects", {}).items()}
+    for name, value in overrides.items():
+        if name.startswith("apples."):
+            apple_weights[name[len("apples."):]] = value
+        elif name.startswith("effects."):
+            apple_name, _, field = name[len("effects."):].partition(".")
+            apple_effects.setdefault(apple_name, {})[field] = value
+        else:
+            settings[name] = value
+    map_name = settings.pop("map")
+    if level_number == ARCADE_LEVEL:
+        return arcade_class(level_number, level_map(map_name, sprite_names), apple_weights=apple_weights,
+                            apple_effects=apple_effects, **settings)
+    return level_class(level_number, level_map(map_name, sprite_names), score=start_points,
+                       apple_weights=apple_weights, apple_effects=apple_effects, **settings)
+
+
+class Campaign(Mapping):
+    # The campaign's levels by number, each built the first time the game asks for it, with the numbers of the
+    # first and the arcade level for engine.Game.
+    def __init__(self, start_points=0, level_class=engine.Level, arcade_class=engine.ArcadeLevel, sprite_names=None):
+        self.first_level = FIRST_LEVEL
+        self.arcade_level = ARCADE_LEVEL
+        self.start_points = start_points
+        self.level_class = level_class
+        self.arcade_class = arcade_class
+        self.sprite_names = sprite_names
+        self.built = {}
+
+    def __getitem__(self, level_number):
+        if level_number not in self.built:
+            if level_number not in LEVELS:
+                raise KeyError(level_number)
+            self.built[level_number] = build_level(level_number, self.start_points, self.level_class,
+                                                   self.arcade_class, self.sprite_names)
+        return self.built[level_number]
+
+    def __iter__(self):
+        return iter(LEVELS)
+
+    def __len__(self):
+        return len(LEVELS)
+
+
+def build_levels(start_points=0, level_class=engine.Level, arcade_class=engine.ArcadeLevel, sprite_names=None):
+    return Campaign(start_points, level_class, arcade_class, sprite_names)
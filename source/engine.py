@@ -0,0 +1,515 @@
+import bisect
+import collections
+import itertools
+import random
+from array import array
+
+
+# Pure-Python game rules. Nothing in here touches pygame, the window, the mixer or the clock,
+# so a Game can be stepped as fast as Python allows for bots, tests and replays.
+
+# CONSTANTS
+FPS = 6
+UP = 0
+DOWN = 1
+LEFT = 2
+RIGHT = 3
+DIRECTION_NAMES = ("up", "down", "left", "right")
+OPPOSITE = (DOWN, UP, RIGHT, LEFT)
+MOVES = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+# SNAKE PARTS
+TAIL = 0
+BODY = 1
+TURN = 2
+HEAD = 3
+
+# EVENTS
+APPLE_EATEN = "apple_eaten"
+HIT_WALL = "hit_wall"
+BIT_TAIL = "bit_tail"
+BIT_SELF = "bit_self"
+HIT_SNAKE = "hit_snake"
+HEAD_ON = "head_on"
+LEVEL_UP = "level_up"
+GAME_COMPLETED = "game_completed"
+GAME_OVER_EVENTS = (HIT_WALL, BIT_TAIL, BIT_SELF, HIT_SNAKE, HEAD_ON)
+# A tick's events: kind is one of the above, snake the owner of the snake it happened to, cell where it happened,
+# and other the apple eaten, the owner of the snake hit, or the number of the level a LEVEL_UP or GAME_COMPLETED
+# enters.
+Event = collections.namedtuple("Event", "kind snake cell other")
+
+# OWNERS
+# The number every snake marks its cells with in a CollisionMap. A level's own snake is PLAYER.
+NOBODY = 0
+PLAYER = 1
+
+NOT_WALL = bytes([1]) + bytes(255)
+
+# APPLE TYPES
+# Every apple class is registered under the name level settings give its weight and effect by. A level spawns each
+# type with probability weight / sum of weights, from one random number and a bisect of the cumulative weights.
+# Eating an apple gives a random number of points between min_points and max_points, times a random multiplier
+# between min_multiplier and max_multiplier (a withered apple takes them away), and grows the snake by grow cells,
+# or shrinks it when grow is negative. A range of one value doesn't draw from the level's random numbers.
+APPLE_TYPES = {}
+DEFAULT_APPLE_WEIGHTS = {"apple": 61.2, "golden": 20, "shrinking": 12, "withered": 6.8}
+EFFECT_FIELDS = ("min_points", "max_points", "min_multiplier", "max_multiplier", "grow")
+NO_EFFECT = {"min_points": 0, "max_points": 0, "min_multiplier": 1, "max_multiplier": 1, "grow": 0}
+DEFAULT_APPLE_EFFECTS = {
+    "apple": {"min_points": 1, "max_points": 1, "grow": 1},
+    "golden": {"min_points": 2, "max_points": 5, "grow": 2},
+    "shrinking": {"min_points": 1, "max_points": 3, "grow": -5},
+    "withered": {"min_points": 1, "max_points": 5, "grow": 1}
+}
+ARCADE_APPLE_EFFECTS = {
+    "apple": {"min_points": 1, "max_points": 1, "grow": 1},
+    "golden": {"min_points": 2, "max_points": 5, "min_multiplier": 1, "max_multiplier": 5, "grow": 1},
+    "shrinking": {"min_points": 1, "max_points": 3, "min_multiplier": 1, "max_multiplier": 3, "grow": -10},
+    "withered": {"min_points": 2, "max_points": 6, "grow": 1}
+}
+
+
+def apple_type(name):
+    def register(cls):
+        cls.name = name
+        APPLE_TYPES[name] = cls
+        return cls
+    return register
+
+
+def merge_apple_effects(base, changes=None):
+    # The effects of base with the fields given in changes replaced, e.g. {"golden": {"grow": 3}}.
+    effects = {name: dict(NO_EFFECT, **base.get(name, {})) for name in APPLE_TYPES}
+    for name, effect in (changes or {}).items():
+        if name not in APPLE_TYPES:
+            raise ValueError(f"unknown apple type {name!r}, expected one of {', '.join(APPLE_TYPES)}")
+        for field in effect:
+            if field not in EFFECT_FIELDS:
+                raise ValueError(f"unknown effect {field!r} of {name!r} apples, expected one of {', '.join(EFFECT_FIELDS)}")
+        effects[name].update(effect)
+    return effects
+
+
+class Grid:
+    def __init__(self, width, height, walls=()):
+        self.width = width
+        self.height = height
+        if isinstance(walls, (bytes, bytearray)):
+            self.walls = bytearray(walls)
+        else:
+            self.walls = bytearray(width * height)
+            for x, y in walls:
+                self.walls[y * width + x] = 1
+        # The free list of the empty map is built once, and every reset copies it.
+        self.pristine_free = list(itertools.compress(range(width * height), self.walls.translate(NOT_WALL)))
+        self.pristine_free_position = [-1] * (width * height)
+        for position, cell in enumerate(self.pristine_free):
+            self.pristine_free_position[cell] = position
+        self.reset()
+
+    def reset(self):
+        # Copying the free list puts it back in the same order, however the level was played before.
+        self.cells = bytearray(self.width * self.height)
+        self.free = self.pristine_free.copy()
+        self.free_position = self.pristine_free_position.copy()
+
+    def is_wall(self, x, y):
+        return self.walls[y * self.width + x] == 1
+
+    def count(self, x, y):
+        return self.cells[y * self.width + x]
+
+    # owner is the snake taking or leaving the cell, which only a CollisionMap keeps track of.
+    def occupy(self, x, y, owner=NOBODY):
+        cell = y * self.width + x
+        self.cells[cell] += 1
+        if self.cells[cell] == 1 and not self.walls[cell]:
+            position = self.free_position[cell]
+            last = self.free.pop()
+            if last != cell:
+                self.free[position] = last
+                self.free_position[last] = position
+            self.free_position[cell] = -1
+
+    def release(self, x, y, owner=NOBODY):
+        cell = y * self.width + x
+        self.cells[cell] -= 1
+        if self.cells[cell] == 0 and not self.walls[cell]:
+            self.free_position[cell] = len(self.free)
+            self.free.append(cell)
+
+    def is_full(self):
+        return not self.free
+
+    def random_free(self, rng=random):
+        cell = self.free[rng.randrange(len(self.free))]
+        return cell % self.width, cell // self.width
+
+
+class CollisionMap(Grid):
+    # A Grid that also keeps the owner of every snake cell and the apples by cell, so any number of snakes are
+    # checked against walls, apples and each other in O(1) per snake. Snakes mark their body when placed and
+    # unmark a cell when their tail leaves it, and hit() gives a head its cell, so the owners only change where a
+    # head arrives or a tail leaves. A tick is resolved in two passes: every snake is updated first, which moves
+    # the tails on, then move() checks every head against its one cell, so all snakes move at once.
+    def reset(self):
+        super().reset()
+        self.owners = array("H", bytes(2 * self.width * self.height))
+        self.apples = {}
+
+    def occupy(self, x, y, owner=NOBODY):
+        Grid.occupy(self, x, y)
+        if owner:
+            self.owners[y * self.width + x] = owner
+
+    def release(self, x, y, owner=NOBODY):
+        Grid.release(self, x, y)
+        cell = y * self.width + x
+        if self.owners[cell] == owner:
+            self.owners[cell] = NOBODY
+
+    def is_free(self, x, y):
+        cell = y * self.width + x
+        return not self.walls[cell] and not self.owners[cell] and cell not in self.apples
+
+    def add_apple(self, apple):
+        self.apples[apple.y * self.width + apple.x] = apple
+
+    def hit(self, owner, x, y, tail):
+        # The event of one snake's head arriving at x, y, if any, with tail the snake's tail cell. The cell becomes
+        # the snake's unless it hit something, so releasing a dead snake leaves the cell to whoever owns it. Maps
+        # are walled all round (maps.parse_map checks), so a head hits a wall before it could leave the grid.
+        cell = y * self.width + x
+        other = self.owners[cell]
+        if self.walls[cell]:
+            return Event(HIT_WALL, owner, cell, None)
+        if other == owner:
+            return Event(BIT_SELF if cell == tail else BIT_TAIL, owner, cell, None)
+        if other != NOBODY:
+            return Event(HIT_SNAKE, owner, cell, other)
+        self.owners[cell] = owner
+        apple = self.apples.pop(cell, None)
+        if apple is not None:
+            return Event(APPLE_EATEN, owner, cell, apple)
+        return None
+
+    def move(self, moves):
+        # moves: (owner, head x, head y, tail cell) of every snake updated this tick. Returns the tick's events,
+        # at most one per snake, where a head running into a head that arrived this tick kills both.
+        events = []
+        heads = {}
+        for owner, x, y, tail in moves:
+            event = self.hit(owner, x, y, tail)
+            if event is None or event.kind == APPLE_EATEN:
+                heads[y * self.width + x] = owner
+            elif event.kind == HIT_SNAKE and heads.get(event.cell) == event.other:
+                events.append(Event(HEAD_ON, event.other, event.cell, owner))
+                event = Event(HEAD_ON, owner, event.cell, event.other)
+            if event is not None:
+                events.append(event)
+        return events
+
+
+class Level:
+    default_apple_effects = DEFAULT_APPLE_EFFECTS
+
+    def __init__(self, level_number, level_map, snake_x=None, snake_y=None, score=0, score_to_level_up=5, next_level=None,
+                 apple_weights=None, apples_number=1, tick_rate=FPS, apple_effects=None):
+        self.level_number = level_number
+        self.map = level_map
+        self.width = level_map.width
+        self.height = level_map.height
+        self.snake_x = snake_x or self.width // 2
+        self.snake_y = snake_y or self.height // 2
+        self.grid = CollisionMap(self.width, self.height, level_map.tiles)
+        self.snake = Snake(self.snake_x, self.snake_y, self.grid)
+        self.score = score
+        self.score_to_level_up = score_to_level_up
+        self.next_level = next_level
+        self.apple_weights = dict(apple_weights or DEFAULT_APPLE_WEIGHTS)
+        for name in self.apple_weights:
+            if name not in APPLE_TYPES:
+                raise ValueError(f"unknown apple type {name!r}, expected one of {', '.join(APPLE_TYPES)}")
+        self.apple_types = [APPLE_TYPES[name] for name in self.apple_weights]
+        self.apple_cumulative_weights = list(itertools.accumulate(self.apple_weights.values()))
+        self.apple_effects = merge_apple_effects(self.default_apple_effects, apple_effects)
+        self.apples_number = apples_number
+        self.apples = []
+        self.random = random
+        self.tick_rate = tick_rate
+        self.apples_clock = 0
+        self.apples_timer = 50 / FPS
+        self.spawn_apples()
+
+    def is_final_level(self):
+        return self.next_level is None
+
+    def is_wall(self, x, y):
+        return self.grid.is_wall(x, y)
+
+    def ticks(self, seconds):
+        return round(seconds * self.tick_rate)
+
+    def spawn_apples(self):
+        for apple in self.apples:
+            self.grid.release(apple.x, apple.y)
+        self.apples.clear()
+        self.grid.apples.clear()
+        self.apples_clock = 0
+        for _ in range(self.random.randint(1, self.apples_number)):
+            if self.grid.is_full():
+                break
+            apple = self.random_apple_type()(self)
+            self.apples.append(apple)
+            self.grid.add_apple(apple)
+
+    def random_apple_type(self):
+        weights = self.apple_cumulative_weights
+        return self.apple_types[bisect.bisect(weights, self.random.random() * weights[-1])]
+
+    def step(self, direction=None):
+        snake = self.snake
+        snake.update(direction)
+        event = self.grid.hit(PLAYER, snake.x, snake.y, snake.tail_cell())
+        if event is None:
+            events = []
+        else:
+            events = [event]
+            if event.kind == APPLE_EATEN:
+                event.other.eat_effect()
+                self.spawn_apples()
+
+        if self.apples_clock >= self.ticks(self.apples_timer):
+            self.spawn_apples()
+        self.apples_clock += 1
+        return events
+
+    def start(self, start_score=None):
+        self.grid.reset()
+        self.apples.clear()
+        self.snake.place(self.snake_x, self.snake_y)
+        self.spawn_apples()
+        self.score = start_score or 0
+
+
+class ArcadeLevel(Level):
+    default_apple_effects = ARCADE_APPLE_EFFECTS
+
+    def __init__(self, level_number, level_map, snake_x, snake_y, apple_weights=None, apples_number=False, tick_rate=FPS,
+                 apple_effects=None):
+        super().__init__(level_number, level_map, snake_x, snake_y, 0, -1, apple_weights=apple_weights,
+                         apples_number=apples_number, tick_rate=tick_rate, apple_effects=apple_effects)
+        self.apples_timer = 25 / FPS
+
+
+class Game:
+    # Every level of a game draws from the game's own seeded RNG, and every tick's input is kept in
+    # self.inputs (0 for no input, direction + 1 otherwise), so the seed and the inputs replay the game exactly.
+    # levels maps level numbers to levels and a level's next_level is a number, so a mapping that builds levels on
+    # demand only ever builds the ones that are played. A game starts on first_level, by default, and goes back
+    # there after a game over; after the final level it goes to arcade_level, or starts that level over without
+    # one. Both default to the levels' own, as a campaign.Campaign has them, else the lowest level number and none.
+    def __init__(self, levels, level_number=None, seed=None, first_level=None, arcade_level=None):
+        self.levels = levels
+        self.first_level = first_level if first_level is not None else getattr(levels, "first_level", None)
+        if self.first_level is None:
+            self.first_level = min(levels)
+        self.arcade_level = arcade_level if arcade_level is not None else getattr(levels, "arcade_level", None)
+        if level_number is None:
+            level_number = self.first_level
+        self.level_number = level_number
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.random = random.Random(self.seed)
+        self.level = self.enter(level_number)
+        self.start_score = self.level.score
+        self.level.start(self.start_score)
+        self.last_score = self.level.score
+        self.inputs = bytearray()
+        self.ticks = 0
+
+    def enter(self, level_number):
+        level = self.levels[level_number]
+        level.random = self.random
+        return level
+
+    def step(self, direction=None):
+        level = self.level
+        events = level.step(direction)
+        self.inputs.append(0 if direction is None else direction + 1)
+        self.ticks += 1
+
+        if events and events[-1].kind in GAME_OVER_EVENTS:
+            self.last_score = level.score
+            if not isinstance(level, ArcadeLevel) and events[-1].kind != HIT_WALL:
+                self.level = self.enter(self.first_level)
+            self.level.start()
+        elif level.score >= level.score_to_level_up > 0:
+            self.last_score = level.score
+            if level.is_final_level():
+                self.level = self.enter(level.level_number if self.arcade_level is None else self.arcade_level)
+                events.append(Event(GAME_COMPLETED, PLAYER, None, self.level.level_number))
+            else:
+                self.level = self.enter(level.next_level)
+                events.append(Event(LEVEL_UP, PLAYER, None, self.level.level_number))
+            self.level.start(self.last_score)
+        return events
+
+
+class Snake:
+    # The body is a ring buffer of packed entries, tail first: cell index << 4 | entered direction << 2 | left direction.
+    # The head's left direction is the one it is currently moving in.
+    __slots__ = ("grid", "owner", "width", "body", "mask", "start", "length", "x", "y", "direction", "grow_count")
+
+    def __init__(self, x, y, grid, capacity=16, owner=PLAYER):
+        self.grid = grid
+        self.owner = owner
+        self.width = grid.width
+        size = 1
+        while size < capacity:
+            size *= 2
+        self.body = array("q", bytes(8 * size))
+        self.mask = size - 1
+        self.start = 0
+        self.length = 0
+        self.place(x, y)
+
+    def __len__(self):
+        return self.length
+
+    def place(self, x, y):
+        self.x = x
+        self.y = y
+        self.direction = DOWN
+        self.grow_count = 0
+        self.start = 0
+        self.length = 2
+        self.body[0] = ((y - 1) * self.width + x) << 4 | DOWN << 2 | DOWN
+        self.body[1] = (y * self.width + x) << 4 | DOWN << 2 | DOWN
+        self.grid.occupy(x, y - 1, self.owner)
+        self.grid.occupy(x, y, self.owner)
+
+    def head_cell(self):
+        return self.y * self.width + self.x
+
+    def tail_cell(self):
+        return self.body[self.start] >> 4
+
+    def can_turn(self, direction):
+        return direction != OPPOSITE[self.direction]
+
+    def update(self, direction=None):
+        if direction is not None and direction != OPPOSITE[self.direction]:
+            self.direction = direction
+        direction = self.direction
+        dx, dy = MOVES[direction]
+        self.x += dx
+        self.y += dy
+
+        if self.length == self.mask + 1:
+            self.expand()
+        body = self.body
+        mask = self.mask
+        head = (self.start + self.length - 1) & mask
+        body[head] = body[head] & ~3 | direction
+        body[(head + 1) & mask] = (self.y * self.width + self.x) << 4 | direction << 2 | direction
+        self.length += 1
+        self.grid.occupy(self.x, self.y)
+
+        if self.grow_count > 0:
+            self.grow_count -= 1
+        elif self.grow_count < 0:
+            self.grow_count += 1
+            if self.length > 4:
+                self.pop_tail()
+                self.pop_tail()
+        else:
+            self.pop_tail()
+
+    def pop_tail(self):
+        cell = self.body[self.start] >> 4
+        self.grid.release(cell % self.width, cell // self.width, self.owner)
+        self.start = (self.start + 1) & self.mask
+        self.length -= 1
+
+    def expand(self):
+        entries = list(self.entries())
+        self.body = array("q", bytes(16 * (self.mask + 1)))
+        self.body[:len(entries)] = array("q", entries)
+        self.mask = self.mask * 2 + 1
+        self.start = 0
+
+    def entries(self):
+        for i in range(self.length):
+            yield self.body[(self.start + i) & self.mask]
+
+    def parts(self):
+        last = self.length - 1
+        for i, entry in enumerate(self.entries()):
+            cell = entry >> 4
+            entered = entry >> 2 & 3
+            left = entry & 3
+            if i == 0:
+                part, towards, came_from = TAIL, left, None
+            elif i == last:
+                part, towards, came_from = HEAD, self.direction, None
+            elif entered == left:
+                part, towards, came_from = BODY, left, None
+            else:
+                part, towards, came_from = TURN, left, OPPOSITE[entered]
+            yield cell % self.width, cell // self.width, part, towards, came_from
+
+    def grow(self, amount):
+        self.grow_count += amount
+
+    def restart(self, x, y):
+        for entry in self.entries():
+            cell = entry >> 4
+            self.grid.release(cell % self.width, cell // self.width, self.owner)
+        self.place(x, y)
+
+
+@apple_type("apple")
+class Apple:
+    def __init__(self, level=None,):
+        self.level = level
+        self.x = 0
+        self.y = 0
+        self.randomize()
+
+    def points(self):
+        effect = self.level.apple_effects[self.name]
+        rng = self.level.random
+        points = effect["min_points"]
+        if effect["max_points"] != points:
+            points = rng.randint(points, effect["max_points"])
+        if effect["max_multiplier"] != effect["min_multiplier"]:
+            points *= rng.randint(effect["min_multiplier"], effect["max_multiplier"])
+        else:
+            points *= effect["min_multiplier"]
+        return points
+
+    def eat_effect(self):
+        self.level.score += self.points()
+        self.level.snake.grow_count += self.level.apple_effects[self.name]["grow"]
+
+    def randomize(self):
+        self.x, self.y = self.level.grid.random_free(self.level.random)
+        self.level.grid.occupy(self.x, self.y)
+
+
+@apple_type("golden")
+class GoldenApple(Apple):
+    pass
+
+
+@apple_type("shrinking")
+class ShrinkingApple(Apple):
+    pass
+
+
+@apple_type("withered")
+class WitheredApple(Apple):
+    def eat_effect(self):
+        self.level.score = max(self.level.score - self.points(), 0)
+        self.level.snake.grow_count += self.level.apple_effects[self.name]["grow"]
@@ -0,0 +1,141 @@
+import random
+
+import numpy as np
+
+import engine
+from engine import GAME_OVER_EVENTS
+
+# A reset()/step() environment around one engine.Level, for training agents, in the shape of Gymnasium's API without
+# depending on it. Observations are one preallocated uint8 array of CHANNELS x height x width that every step
+# rewrites in place, so hold on to a copy if you need an old one. Walls are written once. The body channel is
+# the grid's occupancy counts (a view of the Grid's bytearray, not a copy) with the apples and the head taken out.
+#
+# The reward of a step is the change of the level's score, which is exactly what the apples' eat_effect gave or took,
+# plus death_reward when the snake dies. Reaching the level's goal ends the episode as well.
+
+# CHANNELS
+WALLS = 0
+BODY = 1
+HEAD = 2
+APPLE = 3
+GOLDEN_APPLE = 4
+SHRINKING_APPLE = 5
+WITHERED_APPLE = 6
+CHANNELS = 7
+APPLE_CHANNELS = {
+    engine.Apple: APPLE,
+    engine.GoldenApple: GOLDEN_APPLE,
+    engine.ShrinkingApple: SHRINKING_APPLE,
+    engine.WitheredApple: WITHERED_APPLE
+}
+
+# ACTIONS
+# 0-3 turn to engine.UP, DOWN, LEFT or RIGHT; NO_TURN keeps going straight.
+NO_TURN = 4
+ACTION_COUNT = 5
+
+
+class SnakeEnv:
+    def __init__(self, level, frame_skip=1, max_ticks=None, death_reward=-1.0, seed=None, out=None):
+        self.level = level
+        self.frame_skip = frame_skip
+        self.max_ticks = max_ticks
+        self.death_reward = death_reward
+        self.observation_shape = (CHANNELS, level.height, level.width)
+        self.observation = np.zeros(self.observation_shape, dtype=np.uint8) if out is None else out
+        self.observation[WALLS] = np.frombuffer(level.map.tiles, dtype=np.uint8).reshape(level.height, level.width)
+        self.random = random.Random(seed)
+        self.cells = None
+        self.head = None
+        self.apple_cells = []
+        self.ticks = 0
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.random.seed(seed)
+        self.level.random = random.Random(self.random.getrandbits(64))
+        self.level.start()
+        # Grid.reset() made a new bytearray, so the view has to be taken again.
+        self.cells = np.frombuffer(self.level.grid.cells, dtype=np.uint8).reshape(self.level.height, self.level.width)
+        self.observation[HEAD:].fill(0)
+        self.head = None
+        self.apple_cells = []
+        self.ticks = 0
+        self.observe()
+        return self.observation, {"score": self.level.score}
+
+    def step(self, action):
+        level = self.level
+        direction = None if action == NO_TURN else int(action)
+        reward = 0.0
+        events = []
+        terminated = False
+        for _ in range(self.frame_skip):
+            score = level.score
+            events = level.step(direction)
+            direction = None
+            self.ticks += 1
+            reward += level.score - score
+            if events and events[-1].kind in GAME_OVER_EVENTS:
+                reward += self.death_reward
+                terminated = True
+                break
+            if level.score >= level.score_to_level_up > 0:
+                terminated = True
+                break
+        self.observe()
+        truncated = not terminated and self.max_ticks is not None and self.ticks >= self.max_ticks
+        return self.observation, reward, terminated, truncated, {"score": level.score, "events": events}
+
+    def observe(self):
+        observation = self.observation
+        level = self.level
+        np.minimum(self.cells, 1, out=observation[BODY])
+        for channel, y, x in self.apple_cells:
+            observation[channel, y, x] = 0
+        self.apple_cells = [(APPLE_CHANNELS[type(apple)], apple.y, apple.x) for apple in level.apples]
+        for channel, y, x in self.apple_cells:
+            observation[BODY, y, x] = 0
+            observation[channel, y, x] = 1
+        if self.head:
+            observation[HEAD][self.head] = 0
+        snake = level.snake
+        if 0 <= snake.x < level.width and 0 <= snake.y < level.height:
+            self.head = (snake.y, snake.x)
+            observation[BODY][self.head] = 0
+            observation[HEAD][self.head] = 1
+        else:
+            self.head = None
+
+
+class VectorEnv:
+    # n SnakeEnvs whose observations are slices of one (n, CHANNELS, height, width) array. A sub-environment that
+    # finishes is reset on the spot, like Gymnasium's vector environments; the step's info then carries the final
+    # score under "final_score", and the observation is already the new episode's first.
+    def __init__(self, make_level, n, frame_skip=1, max_ticks=None, death_reward=-1.0, seed=None):
+        first = make_level()
+        self.observation_shape = (CHANNELS, first.height, first.width)
+        self.observations = np.zeros((n,) + self.observation_shape, dtype=np.uint8)
+        seeds = random.Random(seed)
+        self.envs = [SnakeEnv(first if index == 0 else make_level(), frame_skip, max_ticks, death_reward,
+                              seeds.getrandbits(64), self.observations[index]) for index in range(n)]
+        self.rewards = np.zeros(n, dtype=np.float32)
+        self.terminated = np.zeros(n, dtype=bool)
+        self.truncated = np.zeros(n, dtype=bool)
+
+    def reset(self, seed=None):
+        for index, env in enumerate(self.envs):
+            env.reset(None if seed is None else seed + index)
+        return self.observations, {}
+
+    def step(self, actions):
+        final_scores = {}
+        for index, (env, action) in enumerate(zip(self.envs, actions)):
+            _, reward, terminated, truncated, info = env.step(action)
+            self.rewards[index] = reward
+            self.terminated[index] = terminated
+            self.truncated[index] = truncated
+            if terminated or truncated:
+                final_scores[index] = info["score"]
+                env.reset()
+        return self.observations, self.rewards, self.terminated, self.truncated, {"final_score": final_scores}
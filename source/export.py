@@ -0,0 +1,190 @@
+import argparse
+import os
+import queue
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+import pygame
+
+import engine
+import main
+from replay import Replay
+
+# Offscreen export of replays: every tick is drawn by the game's own renderer onto an in-memory canvas, with the
+# dirty-rect redraw, copied (or scaled) into one of SLOTS preallocated frame surfaces and queued for a writer
+# thread. The writer hands each frame's pixels to its output straight from the surface's buffer, without a copy,
+# and gives the surface back for reuse, so drawing and encoding run side by side.
+#
+#   python export.py replays/20240101-120000.replay run.mp4 --scale 0.5
+#
+# Video and GIF files are encoded by ffmpeg (or --encoder) reading raw frames on its stdin, an output without
+# an extension is a directory of PNG frames, and a .raw output (or -) is the raw frames themselves.
+
+SLOTS = 8
+PIXEL_FORMATS = {
+    ((0xFF0000, 0xFF00, 0xFF), "little"): "bgr0",
+    ((0xFF0000, 0xFF00, 0xFF), "big"): "0rgb",
+    ((0xFF, 0xFF00, 0xFF0000), "little"): "rgb0",
+    ((0xFF, 0xFF00, 0xFF0000), "big"): "0bgr",
+}
+
+
+def pixel_format(surface):
+    # The name ffmpeg gives to the byte layout of a 32-bit surface's pixels.
+    key = (tuple(surface.get_masks()[:3]), sys.byteorder)
+    if surface.get_bytesize() != 4 or key not in PIXEL_FORMATS:
+        raise ValueError(f"unsupported surface format: {surface.get_bitsize()} bits, masks {surface.get_masks()}")
+    return PIXEL_FORMATS[key]
+
+
+class RawWriter:
+    def __init__(self, path):
+        self.file = sys.stdout.buffer if path == "-" else open(path, "wb")
+
+    def write(self, surface):
+        self.file.write(surface.get_view("1"))
+
+    def close(self):
+        if self.file is not sys.stdout.buffer:
+            self.file.close()
+
+
+class PNGWriter:
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.frames = 0
+
+    def write(self, surface):
+        pygame.image.save(surface, os.path.join(self.path, f"frame-{self.frames:06d}.png"))
+        self.frames += 1
+
+    def close(self):
+        pass
+
+
+class EncoderWriter(RawWriter):
+    def __init__(self, path, size, fps, surface_format, encoder="ffmpeg"):
+        command = shlex.split(encoder) + ["-loglevel", "error", "-y", "-f", "rawvideo", "-pix_fmt", surface_format,
+                                          "-s", f"{size[0]}x{size[1]}", "-r", str(fps), "-i", "-"]
+        if path.lower().endswith(".gif"):
+            command += ["-vf", "split[a][b];[a]palettegen[p];[b][p]paletteuse"]
+        else:
+            command += ["-pix_fmt", "yuv420p"]
+        self.process = subprocess.Popen(command + [path], stdin=subprocess.PIPE)
+        self.file = self.process.stdin
+
+    def close(self):
+        self.file.close()
+        if self.process.wait():
+            raise RuntimeError(f"the encoder exited with status {self.process.returncode}")
+
+
+class FramePipeline:
+    def __init__(self, writer, size, canvas):
+        self.writer = writer
+        self.size = size
+        self.slots = [pygame.Surface(size, 0, canvas) for _ in range(SLOTS)]
+        self.free = queue.Queue()
+        for index in range(SLOTS):
+            self.free.put(index)
+        self.frames = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self.write_loop, name="frame-writer", daemon=True)
+        self.thread.start()
+
+    def write_loop(self):
+        while True:
+            index = self.frames.get()
+            if index is None:
+                return
+            if self.error is None:
+                try:
+                    self.writer.write(self.slots[index])
+                except Exception as error:
+                    self.error = error
+            self.free.put(index)
+
+    def add(self, canvas):
+        if self.error:
+            raise self.error
+        index = self.free.get()
+        if canvas.get_size() == self.size:
+            self.slots[index].blit(canvas, (0, 0))
+        else:
+            pygame.transform.smoothscale(canvas, self.size, self.slots[index])
+        self.frames.put(index)
+
+    def close(self):
+        self.frames.put(None)
+        self.thread.join()
+        self.writer.close()
+        if self.error:
+            raise self.error
+
+
+def open_writer(path, size, fps, surface_format, encoder="ffmpeg"):
+    if path in ("-", os.devnull) or path.lower().endswith(".raw"):
+        return RawWriter(path)
+    if not os.path.splitext(path)[1]:
+        return PNGWriter(path)
+    return EncoderWriter(path, size, fps, surface_format, encoder)
+
+
+def export_replay(replay, path, scale=1.0, fps=None, encoder="ffmpeg", ticks=None):
+    # Writes the replay's first frame and one frame per tick after it, and returns the number of frames.
+    canvas = pygame.Surface((main.WINDOW_WIDTH, main.WINDOW_HEIGHT)).convert()
+    # Even sizes, which most video codecs need.
+    size = (round(main.WINDOW_WIDTH * scale / 2) * 2, round(main.WINDOW_HEIGHT * scale / 2) * 2)
+    game = engine.Game(main.build_levels(replay.start_score), replay.level_number, replay.seed)
+    pipeline = FramePipeline(open_writer(path, size, fps or game.level.tick_rate, pixel_format(canvas), encoder),
+                             size, canvas)
+    level = None
+    directions = replay.directions()
+    frames = 0
+    try:
+        while True:
+            if game.level is not level:
+                level = game.level
+                level.draw(canvas)
+            else:
+                level.redraw(canvas)
+            pipeline.add(canvas)
+            frames += 1
+            direction = next(directions, False)
+            if direction is False or (ticks is not None and game.ticks >= ticks):
+                break
+            game.step(direction)
+    finally:
+        pipeline.close()
+    return frames
+
+
+def setup():
+    pygame.init()
+    main.window = pygame.display.set_mode((1, 1))
+    main.atlas.load()
+    main.load_fonts()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a replay offscreen to a video, a GIF, PNG frames or raw frames.")
+    parser.add_argument("replay")
+    parser.add_argument("output", help="a video or .gif file, a directory for PNG frames, or a .raw file or - for raw frames")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--fps", type=float, help="frames per second of the video, the level's tick rate by default")
+    parser.add_argument("--encoder", default="ffmpeg", help="the encoder command, given ffmpeg's arguments")
+    parser.add_argument("--ticks", type=int, help="stop after this many ticks")
+    args = parser.parse_args()
+
+    setup()
+    started = time.perf_counter()
+    frames = export_replay(Replay.load(args.replay), args.output, args.scale, args.fps, args.encoder, args.ticks)
+    elapsed = time.perf_counter() - started
+    print(f"{frames} frames in {elapsed:.1f} s ({frames / elapsed:.0f} frames/s)", file=sys.stderr)
@@ -1,7 +1,20 @@
 import pygame
+import atexit
+import collections
+import functools
 import os
-import random
 import sys
+import time
+import campaign
+import engine
+from engine import UP, DOWN, LEFT, RIGHT, HEAD, OPPOSITE, APPLE_EATEN, HIT_WALL, BIT_TAIL, BIT_SELF, LEVEL_UP, GAME_COMPLETED, \
+    GAME_OVER_EVENTS
+from audio import Music, SoundBank
+from policies import Autopilot
+from profiler import profiler
+from replay import Replay, replay_game
+from scores import ScoreStore, SessionRecorder, scores_path
+from sprites import ATLAS_LAYOUT, SPRITE_IDS, SpriteAtlas, snake_sprite_id
 
 # CONSTANTS
 WINDOW_WIDTH = 1280
@@ -9,618 +22,626 @@ WINDOW_HEIGHT = 720
 CELL_SIZE = 80
 GRID_WIDTH = WINDOW_WIDTH // CELL_SIZE
 GRID_HEIGHT = WINDOW_HEIGHT // CELL_SIZE
-FPS = 6
+RENDER_FPS = 60
+CHUNK_CELLS = 4
+CHUNK_CACHE_SIZE = 64
+MAX_FRAME_TIME = 0.25
+PROFILE_REFRESH = 0.5
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
 RED = (255, 0, 0)
 GREEN = (50, 155, 0)
+LIGHT_RED = (255, 90, 90)
+LIGHT_GREEN = (90, 200, 40)
 GOLD = (255, 215, 0)
 
+# FONTS
+FONT_HUD = ("Roboto", 40)
+FONT_GOAL = ("Roboto", 20)
+FONT_TITLE = ("Roboto", 120)
+FONT_SUBTITLE = ("Roboto Bold", 40)
+FONT_BUTTON = ("Roboto", 30)
+FONTS = {}
+
 # SPRITE ASSETS
-assets_path = os.path.join(os.getcwd(), 'assets')
-# print(assets_path)
-SNAKE_SPRITES = {}
-for file_name in sorted(os.listdir(os.path.join(assets_path, 'snake'))):
-    image_name = file_name[6:-4].upper()
-    SNAKE_SPRITES[image_name] = pygame.image.load(os.path.join(assets_path, 'snake', file_name))
-CELL_SPRITES = {}
-for file_name in sorted(os.listdir(os.path.join(assets_path, 'level'))):
-    image_name = file_name[:-4].upper()
-    CELL_SPRITES[image_name] = pygame.image.load(os.path.join(assets_path, 'level', file_name))
-APPLE_SPRITES = {}
-for file_name in sorted(os.listdir(os.path.join(assets_path, 'apple'))):
-    image_name = file_name[:-4].upper()
-    APPLE_SPRITES[image_name] = pygame.image.load(os.path.join(assets_path, 'apple', file_name))
-# print(SNAKE_SPRITES)
-# print(CELL_SPRITES)
-# print(APPLE_SPRITES)
+assets_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
+atlas = SpriteAtlas(assets_path, CELL_SIZE, os.path.join(assets_path, '.cache', f'atlas-{CELL_SIZE}-{ATLAS_LAYOUT}.png'))
+
+replays_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'replays')
+profiles_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles')
 
 # MUSIC ASSETS:
-background_music = os.path.join(os.getcwd(), 'assets', 'vlad-8_bit_snake.mp3')
-arcade_music = os.path.join(os.getcwd(), 'assets', 'slow_ethereal_sequencer.mp3')
-sound_apple = os.path.join(os.getcwd(), 'assets', 'apple_eaten.mp3')
-sound_death = os.path.join(os.getcwd(), 'assets', 'death_sound.mp3')
-sound_start = os.path.join(os.getcwd(), 'assets', 'level_start.mp3')
-sound_level_up = os.path.join(os.getcwd(), 'assets', 'level_up.mp3')
-
-class Level:
-    def __init__(self, level_number, level_map, snake_x=None, snake_y=None, score=0, score_to_level_up=5, next_level=None, golden_apple_chance=0.2,
-                 shrink_apple_chance=0.15, wither_apple_chance=0.1, apples_number=1):
-        self.level_number = level_number
-        self.map = level_map
-        self.snake_x = snake_x
-        self.snake_y = snake_y
-        self.snake = Snake(self.snake_x or GRID_WIDTH // 2, self.snake_y or GRID_HEIGHT // 2)
-        self.score = score
-        self.score_to_level_up = score_to_level_up
-        self.next_level = next_level
-        self.level_music = pygame.mixer.Sound(background_music)
-        self.golden_apple_chance = golden_apple_chance
-        self.shrink_apple_chance = shrink_apple_chance
-        self.wither_apple_chance = wither_apple_chance
-        self.apples_number = apples_number
-        self.apples = []
-        self.apples_clock = 0
-        self.apples_timer = 300
-        self.spawn_apples()
-
-    def is_final_level(self):
-        return self.next_level is None
-
-    def spawn_apples(self):
-        self.apples.clear()
-        self.apples_clock = 0
-        for _ in range(random.randint(1, self.apples_number)):
-            if random.random() <= self.golden_apple_chance:
-                self.apples.append(GoldenApple(self))
-            elif random.random() <= self.shrink_apple_chance:
-                self.apples.append(ShrinkingApple(self))
-            elif random.random() <= self.wither_apple_chance:
-                self.apples.append(WitheredApple(self))
-            else:
-                self.apples.append(Apple(self))
-
-    def draw_score(self):
-        font = pygame.font.SysFont("Roboto", 40)
-        score_text = font.render("Score: " + str(self.score), True, WHITE)
-        score_rect = pygame.Surface((score_text.get_width() + 20, score_text.get_height() + 10))
-        score_rect.set_alpha(160)
-        score_rect.fill((0, 0, 0))
-        score_rect.blit(score_text, (10, 5))
-        window.blit(score_rect, (WINDOW_WIDTH - score_rect.get_width() - 15, 0 + 15))
-
-    def draw_level(self):
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                sprite = self.map[y][x].sprite
-                window.blit(sprite, (x * CELL_SIZE, y * CELL_SIZE))
-
-        font = pygame.font.SysFont("Roboto", 40)
-        level_text = font.render("Level: " + str(self.level_number), True, WHITE)
-        level_rect = pygame.Surface((level_text.get_width() + 20, level_text.get_height() + 10))
-        level_rect.set_alpha(160)
-        level_rect.fill((0, 0, 0))
-        level_rect.blit(level_text, (10, 5))
-        window.blit(level_rect, (15, 15))
-
-        font = pygame.font.SysFont("Roboto", 20)
-        goal_text = font.render("Goal to the next level: " + str(self.score_to_level_up) + " points", True, WHITE)
-        goal_rect = pygame.Surface((goal_text.get_width() + 20, goal_text.get_height() + 10))
-        goal_rect.set_alpha(160)
-        goal_rect.fill((0, 0, 0))
-        goal_rect.blit(goal_text, (10, 5))
-        window.blit(goal_rect,
-                    (WINDOW_WIDTH // 2 - goal_rect.get_width() // 2, WINDOW_HEIGHT - 15 - goal_rect.get_height()))
-
-    def draw_apples(self):
+background_music = os.path.join(assets_path, 'vlad-8_bit_snake.mp3')
+arcade_music = os.path.join(assets_path, 'slow_ethereal_sequencer.mp3')
+sounds = SoundBank({
+    "apple": os.path.join(assets_path, 'apple_eaten.mp3'),
+    "death": os.path.join(assets_path, 'death_sound.mp3'),
+    "start": os.path.join(assets_path, 'level_start.mp3'),
+    "level_up": os.path.join(assets_path, 'level_up.mp3')
+}, priorities={"death": 3, "level_up": 3, "start": 2, "apple": 1}, voices={"apple": 2})
+music = Music()
+
+APPLE_SPRITE_IDS = {
+    engine.Apple: SPRITE_IDS["APPLE"],
+    engine.GoldenApple: SPRITE_IDS["APPLE_GOLDEN"],
+    engine.ShrinkingApple: SPRITE_IDS["APPLE_SHRINK"],
+    engine.WitheredApple: SPRITE_IDS["APPLE_WITHERED"]
+}
+KEY_DIRECTIONS = {pygame.K_UP: UP, pygame.K_DOWN: DOWN, pygame.K_LEFT: LEFT, pygame.K_RIGHT: RIGHT}
+GAME_OVER_MESSAGES = {
+    HIT_WALL: ("You've hit the wall!", "Replay the level"),
+    BIT_TAIL: ("You've bitten your tail!", "Start over"),
+    BIT_SELF: ("You've bitten yourself!", "Start over")
+}
+
+class Level(engine.Level):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.level_music = background_music
+        self.background = None
+        self.drawn_cells = {}
+        self.score_panel = None
+        self.score_panel_score = None
+        self.score_rect = pygame.Rect(0, 0, 0, 0)
+        self.head_from = (self.snake.x, self.snake.y)
+        self.drawn_head = None
+        # Maps larger than the window are drawn through a camera that follows the head, from background chunks
+        # rendered on first sight and kept in a small LRU cache.
+        self.scrolls = self.width * CELL_SIZE > WINDOW_WIDTH or self.height * CELL_SIZE > WINDOW_HEIGHT
+        self.view = pygame.Rect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT)
+        self.chunks = collections.OrderedDict()
+
+    def render_score(self):
+        self.score_panel = text_panel(FONT_HUD, "Score: " + str(self.score))
+        self.score_panel_score = self.score
+        self.score_rect = self.score_panel.get_rect(topright=(WINDOW_WIDTH - 15, 0 + 15))
+
+    def draw_map(self, surface, left=0, top=0, width=None, height=None):
+        sprite_ids = [SPRITE_IDS[name] for name in self.map.palette]
+        for y in range(top, min(top + (height or self.height), self.height)):
+            for x in range(left, min(left + (width or self.width), self.width)):
+                surface.blit(atlas[sprite_ids[self.map.sprites[y * self.width + x]]],
+                             ((x - left) * CELL_SIZE, (y - top) * CELL_SIZE))
+
+    def chunk(self, chunk_x, chunk_y):
+        if (chunk_x, chunk_y) in self.chunks:
+            self.chunks.move_to_end((chunk_x, chunk_y))
+        else:
+            chunk = pygame.Surface((CHUNK_CELLS * CELL_SIZE, CHUNK_CELLS * CELL_SIZE)).convert()
+            chunk.fill(BLACK)
+            self.draw_map(chunk, chunk_x * CHUNK_CELLS, chunk_y * CHUNK_CELLS, CHUNK_CELLS, CHUNK_CELLS)
+            self.chunks[(chunk_x, chunk_y)] = chunk
+            if len(self.chunks) > CHUNK_CACHE_SIZE:
+                self.chunks.popitem(last=False)
+        return self.chunks[(chunk_x, chunk_y)]
+
+    def draw_level(self, surface):
+        self.draw_map(surface)
+        self.draw_labels(surface)
+
+    def draw_labels(self, surface):
+        surface.blit(text_panel(FONT_HUD, "Level: " + str(self.level_number)), (15, 15))
+
+        goal_rect = text_panel(FONT_GOAL, "Goal to the next level: " + str(self.score_to_level_up) + " points")
+        surface.blit(goal_rect,
+                     (WINDOW_WIDTH // 2 - goal_rect.get_width() // 2, WINDOW_HEIGHT - 15 - goal_rect.get_height()))
+
+    def frame_cells(self):
+        # What every non-empty cell shows this frame: (apple sprite ID, snake sprite ID).
+        cells = {}
+        for apple in self.apples:
+            cells[(apple.x, apple.y)] = (APPLE_SPRITE_IDS[type(apple)], None)
+        for x, y, part, towards, came_from in self.snake.parts():
+            if part != HEAD:
+                cells[(x, y)] = (cells.get((x, y), (None, None))[0], snake_sprite_id(part, towards, came_from))
+        return cells
+
+    def frame_head(self, alpha):
+        # The head slides from its previous cell to its current one as alpha goes from 0 to 1.
+        x, y = self.snake.x, self.snake.y
+        from_x, from_y = self.head_from
+        if abs(x - from_x) + abs(y - from_y) == 1:
+            x = from_x + (x - from_x) * alpha
+            y = from_y + (y - from_y) * alpha
+        rect = pygame.Rect(round(x * CELL_SIZE), round(y * CELL_SIZE), CELL_SIZE, CELL_SIZE)
+        return snake_sprite_id(HEAD, self.snake.direction), rect
+
+    def render_background(self):
+        self.background = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
+        self.draw_level(self.background)
+
+    def draw_rects(self, rects, cells, head, surface):
+        if self.background is None:
+            self.render_background()
+        for rect in rects:
+            surface.set_clip(rect)
+            surface.blit(self.background, rect, rect)
+            covered = [(x, y) for y in range(rect.top // CELL_SIZE, (rect.bottom - 1) // CELL_SIZE + 1)
+                       for x in range(rect.left // CELL_SIZE, (rect.right - 1) // CELL_SIZE + 1) if (x, y) in cells]
+            for x, y in covered:
+                if cells[(x, y)][0] is not None:
+                    surface.blit(atlas[cells[(x, y)][0]], (x * CELL_SIZE, y * CELL_SIZE))
+            if rect.colliderect(self.score_rect):
+                surface.blit(self.score_panel, self.score_rect)
+            for x, y in covered:
+                if cells[(x, y)][1] is not None:
+                    surface.blit(atlas[cells[(x, y)][1]], (x * CELL_SIZE, y * CELL_SIZE))
+            if rect.colliderect(head[1]):
+                surface.blit(atlas[head[0]], head[1])
+        surface.set_clip(None)
+        self.drawn_cells = cells
+        self.drawn_head = head
+
+    def draw_view(self, surface, head):
+        # Only the chunks, apples and snake parts inside the camera's view are drawn, then the labels on top.
+        view = self.view
+        view.center = head[1].center
+        view.clamp_ip(pygame.Rect(0, 0, self.width * CELL_SIZE, self.height * CELL_SIZE))
+        surface.fill(BLACK)
+        chunk_size = CHUNK_CELLS * CELL_SIZE
+        for chunk_y in range(max(view.top // chunk_size, 0),
+                             min((view.bottom - 1) // chunk_size, (self.height - 1) // CHUNK_CELLS) + 1):
+            for chunk_x in range(max(view.left // chunk_size, 0),
+                                 min((view.right - 1) // chunk_size, (self.width - 1) // CHUNK_CELLS) + 1):
+                surface.blit(self.chunk(chunk_x, chunk_y), (chunk_x * chunk_size - view.x, chunk_y * chunk_size - view.y))
+
+        left, top = view.left // CELL_SIZE, view.top // CELL_SIZE
+        right, bottom = (view.right - 1) // CELL_SIZE, (view.bottom - 1) // CELL_SIZE
         for apple in self.apples:
-            apple.draw()
+            if left <= apple.x <= right and top <= apple.y <= bottom:
+                surface.blit(atlas[APPLE_SPRITE_IDS[type(apple)]],
+                             (apple.x * CELL_SIZE - view.x, apple.y * CELL_SIZE - view.y))
+        for x, y, part, towards, came_from in self.snake.parts():
+            if part != HEAD and left <= x <= right and top <= y <= bottom:
+                surface.blit(atlas[snake_sprite_id(part, towards, came_from)],
+                             (x * CELL_SIZE - view.x, y * CELL_SIZE - view.y))
+        surface.blit(atlas[head[0]], head[1].move(-view.x, -view.y))
+
+        self.draw_labels(surface)
+        surface.blit(self.score_panel, self.score_rect)
+        self.drawn_head = head
+
+    def draw(self, surface=None, alpha=1.0):
+        surface = surface or window
+        if self.score_panel_score != self.score:
+            self.render_score()
+        rects = [surface.get_rect()]
+        if self.scrolls:
+            self.draw_view(surface, self.frame_head(alpha))
+        else:
+            self.draw_rects(rects, self.frame_cells(), self.frame_head(alpha), surface)
+        return rects
+
+    def redraw(self, surface=None, alpha=1.0):
+        surface = surface or window
+        if self.scrolls:
+            return self.draw(surface, alpha)
+        cells = self.frame_cells()
+        head = self.frame_head(alpha)
+        rects = [pygame.Rect(x * CELL_SIZE, y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
+                 for x, y in cells.keys() | self.drawn_cells.keys() if cells.get((x, y)) != self.drawn_cells.get((x, y))]
+        if head != self.drawn_head:
+            rects.append(head[1].union(self.drawn_head[1]) if self.drawn_head else head[1])
+        if self.score_panel_score != self.score:
+            old_rect = self.score_rect
+            self.render_score()
+            rects.append(old_rect.union(self.score_rect))
+        self.draw_rects(rects, cells, head, surface)
+        return rects
 
     def game_over(self, message=None, button_text=None):
-        self.level_music.stop()
-        game_over_sound.play()
-        game_over_sound.set_volume(0.5)
-        MenuScreen("Game Over!", message, button_text or "Replay the level!", "Exit the game!", "exit").show()
+        music.fade_out()
+        sounds.play("death", 0.5)
+        return MenuScreen("Game Over!", message, button_text or "Replay the level!", "Exit the game!", "exit")
 
     def level_up(self):
-        self.level_music.stop()
-        level_up_sound.play()
-        level_up_sound.set_volume(0.4)
-
-    def start(self, start_score=None):
-        self.spawn_apples()
-        self.draw_apples()
-        self.snake.restart(self.snake_x, self.snake_y)
-        self.score = start_score or 0
-        level_start.play()
-        level_start.set_volume(0.6)
-        self.level_music.play()
-        self.level_music.set_volume(0.15)
-
-
-class ArcadeLevel(Level):
-    def __init__(self, level_number, level_map, snake_x, snake_y, golden_apple_chance=None,
-                 shrink_apple_chance=None, wither_apple_chance=None, apples_number=False):
-        super().__init__(level_number, level_map, snake_x, snake_y, 0, -1, golden_apple_chance=golden_apple_chance,
-                         shrink_apple_chance=shrink_apple_chance, wither_apple_chance=wither_apple_chance, apples_number=apples_number)
-        self.snake_x = snake_x
-        self.snake_y = snake_y
-        self.level_music = pygame.mixer.Sound(arcade_music)
-        self.apples_timer = 150
-
-    def draw_level(self):
-        for y in range(GRID_HEIGHT):
-            for x in range(GRID_WIDTH):
-                sprite = self.map[y][x].sprite
-                window.blit(sprite, (x * CELL_SIZE, y * CELL_SIZE))
-
-        font = pygame.font.SysFont("Roboto", 40)
-        level_text = font.render("Arcade Mode", True, WHITE)
-        level_rect = pygame.Surface((level_text.get_width() + 20, level_text.get_height() + 10))
-        level_rect.set_alpha(160)
-        level_rect.fill((0, 0, 0))
-        level_rect.blit(level_text, (10, 5))
-        window.blit(level_rect, (15, 15))
-
-
-class Cell:
-    def __init__(self, cell_type="empty", sprite=CELL_SPRITES['GRASS']):
-        self.cell_type = cell_type
-        self.sprite = sprite
-
-    def __repr__(self):
-        return f"Cell: {self.cell_type}"
-
-
-class Snake(pygame.sprite.Sprite):
-    def __init__(self, x, y):
-        super().__init__()
-        self.head = SnakeSegment(x, y, "head", "down")
-        self.segments = []
-        self.tail = SnakeSegment(x, y-1, "tail", "down")
-        self.grow_count = 0
-
-    def update(self, keys):
-        if keys[pygame.K_UP] and self.head.direction_towards != "down":
-            self.head.direction_towards = "up"
-        elif keys[pygame.K_DOWN] and self.head.direction_towards != "up":
-            self.head.direction_towards = "down"
-        elif keys[pygame.K_LEFT] and self.head.direction_towards != "right":
-            self.head.direction_towards = "left"
-        elif keys[pygame.K_RIGHT] and self.head.direction_towards != "left":
-            self.head.direction_towards = "right"
-
-        if self.head.direction_towards == "up":
-            self.head.y -= 1
-        elif self.head.direction_towards == "down":
-            self.head.y += 1
-        elif self.head.direction_towards == "left":
-            self.head.x -= 1
-        elif self.head.direction_towards == "right":
-            self.head.x += 1
-
-        if len(self.segments) > 0:
-            last_direction = self.segments[0].direction_towards
-        else:
-            last_direction = self.tail.direction_towards
-
-        if self.head.direction_towards != last_direction:
-            if self.head.direction_towards == "up":
-                if last_direction == "left":
-                    self.segments.insert(0, SnakeSegment(self.head.x, self.head.y + 1, "turn", "up", "right"))
-                elif last_direction == "right":
-                    self.segments.insert(0, SnakeSegment(self.head.x, self.head.y + 1, "turn", "up", "left"))
-            elif self.head.direction_towards == "down":
-                if last_direction == "left":
-                    self.segments.insert(0, SnakeSegment(self.head.x, self.head.y - 1, "turn", "down", "right"))
-                elif last_direction == "right":
-                    self.segments.insert(0, SnakeSegment(self.head.x, self.head.y - 1, "turn", "down", "left"))
-            elif self.head.direction_towards == "left":
-                if last_direction == "up":
-                    self.segments.insert(0, SnakeSegment(self.head.x + 1, self.head.y, "turn", "left", "down"))
-                elif last_direction == "down":
-                    self.segments.insert(0, SnakeSegment(self.head.x + 1, self.head.y, "turn", "left", "up"))
-            elif self.head.direction_towards == "right":
-                if last_direction == "up":
-                    self.segments.insert(0, SnakeSegment(self.head.x - 1, self.head.y, "turn", "right", "down"))
-                elif last_direction == "down":
-                    self.segments.insert(0, SnakeSegment(self.head.x - 1, self.head.y, "turn", "right", "up"))
-        else:
-            if self.head.direction_towards == "up":
-                self.segments.insert(0, SnakeSegment(self.head.x, self.head.y + 1, "body", self.head.direction_towards))
-            elif self.head.direction_towards == "down":
-                self.segments.insert(0, SnakeSegment(self.head.x, self.head.y - 1, "body", self.head.direction_towards))
-            elif self.head.direction_towards == "left":
-                self.segments.insert(0, SnakeSegment(self.head.x + 1, self.head.y, "body", self.head.direction_towards))
-            elif self.head.direction_towards == "right":
-                self.segments.insert(0, SnakeSegment(self.head.x - 1, self.head.y, "body", self.head.direction_towards))
-
-        if self.grow_count > 0:
-            self.grow_count -= 1
-        elif len(self.segments) > 0:
-            if self.grow_count < 0:
-                self.grow_count += 1
-                if len(self.segments) > 2:
-                    self.tail.x = self.segments[-2].x
-                    self.tail.y = self.segments[-2].y
-                    self.tail.direction_towards = self.segments[-2].direction_towards
-                    self.segments.pop()
-                    self.segments.pop()
-            else:
-                self.tail.x = self.segments[-1].x
-                self.tail.y = self.segments[-1].y
-                self.tail.direction_towards = self.segments[-1].direction_towards
-                self.segments.pop()
-        else:
-            self.tail.x = self.head.x
-            self.tail.y = self.head.y
-            self.tail.direction_towards = self.head.direction_towards
-            if self.head.direction_towards == "up":
-                self.tail.y += 1
-            elif self.head.direction_towards == "down":
-                self.tail.y -= 1
-            elif self.head.direction_towards == "left":
-                self.tail.x += 1
-            elif self.head.direction_towards == "right":
-                self.tail.x -= 1
-
-    def grow(self, amount):
-        self.grow_count += amount
-
-    def restart(self, x, y):
-        self.head = SnakeSegment(x, y, "head", "down")
-        self.segments = []
-        self.tail = SnakeSegment(x, -y, "tail", "down")
-        self.grow_count = 0
-
-    def draw(self):
-        self.head.kill()
-        self.tail.kill()
-        for segment in self.segments:
-            segment.kill()
-        window.blit(self.tail.get_sprite(), (self.tail.x * CELL_SIZE, self.tail.y * CELL_SIZE))
-        for segment in self.segments:
-            window.blit(segment.get_sprite(), (segment.x * CELL_SIZE, segment.y * CELL_SIZE))
-        window.blit(self.head.get_sprite(), (self.head.x * CELL_SIZE, self.head.y * CELL_SIZE))
-
-
-class SnakeSegment(pygame.sprite.Sprite):
-    def __init__(self, x, y, segment_type, dir_to=None, dir_from=None):
-        super().__init__()
-        self.x = x
-        self.y = y
-        self.segment_type = segment_type
-        self.direction_towards = dir_to
-        self.direction_from = dir_from
-
-    def get_sprite(self):
-        if self.segment_type != "turn":
-            return SNAKE_SPRITES[f"{self.segment_type.upper()}-{self.direction_towards.upper()}"]
-        else:
-            return SNAKE_SPRITES[f"TURN-{self.direction_towards.upper()}-{self.direction_from.upper()}"]
-
-
-class Apple(pygame.sprite.Sprite):
-    def __init__(self, level=None,):
-        super().__init__()
-        self.level = level
-        self.x = 0
-        self.y = 0
-        self.randomize()
-
-    def eat_effect(self):
-        self.level.score += 1
-        self.level.snake.grow_count += 1
-
-    def randomize(self):
-        while True:
-            self.x = random.randint(0, GRID_WIDTH - 1)
-            self.y = random.randint(0, GRID_HEIGHT - 1)
-            respawn = False
-            for seg in self.level.snake.segments:
-                if self.x == seg.x and self.y == seg.y:
-                    respawn = True
-            if self.x == self.level.snake.head.x and self.y == self.level.snake.head.y:
-                respawn = True
-            if self.x == self.level.snake.tail.x and self.y == self.level.snake.tail.y:
-                respawn = True
-            for apple in self.level.apples:
-                if self.x == apple.x and self.y == apple.y:
-                    respawn = True
-            if not isinstance(self.level.map[self.y][self.x], Cell) or self.level.map[self.y][self.x].cell_type == "wall":
-                respawn = True
-            if not respawn:
-                break
+        music.fade_out()
+        sounds.play("level_up", 0.4)
 
-    def draw(self):
-        window.blit(APPLE_SPRITES["APPLE"], (self.x * CELL_SIZE, self.y * CELL_SIZE))
+    def play(self, start_volume=0.6):
+        sounds.play("start", start_volume)
+        music.play(self.level_music, 0.15, background_music)
 
 
-class GoldenApple(Apple):
-    def __init__(self, level):
-        super().__init__(level)
+class ArcadeLevel(engine.ArcadeLevel, Level):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.level_music = arcade_music
 
-    def eat_effect(self):
-        if isinstance(self.level, ArcadeLevel):
-            self.level.score += random.randint(2, 5) * random.randint(1, 5)
-            self.level.snake.grow_count += 1
-        else:
-            self.level.score += random.randint(2, 5)
-            self.level.snake.grow_count += 2
+    def draw_level(self, surface):
+        self.draw_map(surface)
 
-    def draw(self):
-        window.blit(APPLE_SPRITES["APPLE_GOLDEN"], (self.x * CELL_SIZE, self.y * CELL_SIZE))
+        surface.blit(text_panel(FONT_HUD, "Arcade Mode"), (15, 15))
 
 
-class ShrinkingApple(Apple):
-    def __init__(self, level):
-        super().__init__(level)
+# The hot paths timed while the profiler is on, on top of the phases of the main loop.
+profiler.instrument(engine.Snake, "update")
+profiler.instrument(engine.CollisionMap, "hit")
+profiler.instrument(engine.Level, "spawn_apples")
+profiler.instrument(Level, "frame_cells")
+profiler.instrument(Level, "render_background")
+profiler.instrument(Level, "draw_rects")
+profiler.instrument(Level, "draw_view")
 
-    def eat_effect(self):
-        if isinstance(self.level, ArcadeLevel):
-            self.level.score += random.randint(1, 3) * random.randint(1, 3)
-            self.level.snake.grow_count -= 10
-        else:
-            self.level.score += random.randint(1, 3)
-            self.level.snake.grow_count -= 5
+def load_fonts():
+    for font in (FONT_HUD, FONT_GOAL, FONT_TITLE, FONT_SUBTITLE, FONT_BUTTON):
+        get_font(font)
 
-    def draw(self):
-        window.blit(APPLE_SPRITES["APPLE_SHRINK"], (self.x * CELL_SIZE, self.y * CELL_SIZE))
 
+def get_font(font):
+    if font not in FONTS:
+        FONTS[font] = pygame.font.SysFont(*font)
+    return FONTS[font]
 
-class WitheredApple(Apple):
-    def __init__(self, level):
-        super().__init__(level)
 
-    def eat_effect(self):
-        if isinstance(self.level, ArcadeLevel):
-            self.level.score -= random.randint(2, 6)
-        else:
-            self.level.score -= random.randint(1, 5)
-        if self.level.score < 0:
-            self.level.score = 0
-        self.level.snake.grow_count += 1
+@functools.lru_cache(maxsize=128)
+def render_text(font, text, colour=WHITE):
+    return get_font(font).render(text, True, colour)
+
+
+@functools.lru_cache(maxsize=128)
+def text_panel(font, text, colour=WHITE, alpha=160):
+    text_surface = render_text(font, text, colour)
+    panel = pygame.Surface((text_surface.get_width() + 20, text_surface.get_height() + 10))
+    panel.set_alpha(alpha)
+    panel.fill((0, 0, 0))
+    panel.blit(text_surface, (10, 5))
+    return panel
+
+
+class DirectionQueue:
+    # Arrow key presses waiting for the next ticks, so two quick turns between ticks both happen.
+    def __init__(self, size=3):
+        self.directions = collections.deque(maxlen=size)
+
+    def push(self, key):
+        if key in KEY_DIRECTIONS:
+            self.directions.append(KEY_DIRECTIONS[key])
+
+    def pop(self, snake):
+        while self.directions:
+            direction = self.directions.popleft()
+            if direction != snake.direction and direction != OPPOSITE[snake.direction]:
+                return direction
+        return None
 
-    def draw(self):
-        window.blit(APPLE_SPRITES["APPLE_WITHERED"], (self.x * CELL_SIZE, self.y * CELL_SIZE))
+    def clear(self):
+        self.directions.clear()
+
+
+class ReplayInput:
+    # Feeds a recorded game's inputs to the loop in place of the keyboard.
+    def __init__(self, replay):
+        self.directions = replay.directions()
+
+    def push(self, key):
+        pass
+
+    def pop(self, snake):
+        return next(self.directions)
+
+    def clear(self):
+        pass
+
+
+class AutopilotInput:
+    # Lets the autopilot steer the game's current level in place of the keyboard.
+    def __init__(self, game):
+        self.game = game
+        self.autopilot = Autopilot()
+
+    def push(self, key):
+        pass
+
+    def pop(self, snake):
+        return self.autopilot(self.game.level)
+
+    def clear(self):
+        pass
+
+
+def close_scores(recorder):
+    recorder.flush()
+    recorder.store.close()
+
+
+def save_replay(game):
+    if game.ticks:
+        os.makedirs(replays_path, exist_ok=True)
+        Replay.from_game(game).save(os.path.join(replays_path, time.strftime("%Y%m%d-%H%M%S") + ".replay"))
+
+
+class ProfilerOverlay:
+    # F3 turns the profiler on and lists every phase's p50/p99 in the bottom left corner; F4 saves what it has
+    # recorded as a Chrome trace and a CSV. The panel is opaque and blitted last, so the dirty-rect redraw can keep
+    # running underneath it; only a change of the panel's size needs a full redraw.
+    def __init__(self):
+        self.panel = None
+        self.rendered = 0.0
+        self.stale = False
+
+    def toggle(self):
+        profiler.toggle()
+        self.panel = None
+        self.stale = True
+        pygame.display.set_caption("Snake Game")
+
+    def render(self):
+        font = get_font(FONT_GOAL)
+        rows = [("phase", "p50 ms", "p99 ms")] + [(name, f"{p50:.2f}", f"{p99:.2f}")
+                                                 for name, (p50, p99, _) in sorted(profiler.percentiles().items())]
+        lines = [[font.render(text, True, WHITE) for text in row] for row in rows]
+        line_height = font.get_linesize()
+        name_width = max(line[0].get_width() for line in lines) + 20
+        column_width = max(max(line[1].get_width(), line[2].get_width()) for line in lines) + 20
+        panel = pygame.Surface((name_width + 2 * column_width + 20, len(lines) * line_height + 10))
+        panel.fill((30, 30, 30))
+        for row, (name, p50, p99) in enumerate(lines):
+            top = 5 + row * line_height
+            panel.blit(name, (10, top))
+            panel.blit(p50, (10 + name_width + column_width - p50.get_width(), top))
+            panel.blit(p99, (10 + name_width + 2 * column_width - p99.get_width(), top))
+        return panel
+
+    def draw(self, surface):
+        now = time.perf_counter()
+        if self.panel is None or now - self.rendered >= PROFILE_REFRESH:
+            size = self.panel and self.panel.get_size()
+            self.panel = self.render()
+            self.rendered = now
+            self.stale = self.stale or (size is not None and size != self.panel.get_size())
+        return surface.blit(self.panel, (15, WINDOW_HEIGHT - 15 - self.panel.get_height()))
+
+    def save(self):
+        if profiler.trace:
+            os.makedirs(profiles_path, exist_ok=True)
+            path = os.path.join(profiles_path, time.strftime("%Y%m%d-%H%M%S"))
+            profiler.save_trace(path + ".json")
+            profiler.save_csv(path + ".csv")
+            pygame.display.set_caption(f"Snake Game - profile saved to {path}.json")
 
 
 class MenuScreen:
+    # A menu over the frame the game was on, run as a state of the main loop. The darkened frame with the title and
+    # subtitle is rendered once, when the menu is first drawn; after that only a button whose hover state changed
+    # is redrawn. handle() returns "continue" or "exit" once the player has chosen, None until then.
     def __init__(self, title="Insert title here!", subtitle: str = "", button1=None, button2=None,
                  escape_behaviour="continue"):
         self.title = title
         self.subtitle = subtitle
-        self.button1 = button1
-        self.button2 = button2
         self.escape_behaviour = escape_behaviour
-
-    def show(self):
-        font_title = pygame.font.SysFont("Roboto", 120)
-        font_subtitle = pygame.font.SysFont("Roboto Bold", 40)
-        font_button = pygame.font.SysFont("Roboto", 30)
-
-        while True:
-            fill_color = (0, 0, 0)
-            alpha = 200
-            fill_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
-            fill_surface.fill((*fill_color, alpha))
-            window.blit(fill_surface, (0, 0))
-            title = font_title.render(self.title, True, GOLD)
-            title_rect = title.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 175))
-            window.blit(title, title_rect)
-            button_1, button_2 = None, None
-
-            if self.subtitle != "":
-                subtitle = font_subtitle.render(self.subtitle, True, WHITE)
-                subtitle_rect = subtitle.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 70))
-                window.blit(subtitle, subtitle_rect)
-
-            if self.button1:
-                button_1 = pygame.Rect(WINDOW_WIDTH // 2 - 150, WINDOW_HEIGHT // 2 + 50, 300, 50)
-                pygame.draw.rect(window, GREEN, button_1)
-                button_1_text = font_button.render(self.button1, True, WHITE)
-                button_1_text_rect = button_1_text.get_rect(center=button_1.center)
-                window.blit(button_1_text, button_1_text_rect)
-
-            if self.button2:
-                button_2 = pygame.Rect(WINDOW_WIDTH // 2 - 150, WINDOW_HEIGHT // 2 + 120, 300, 50)
-                pygame.draw.rect(window, RED, button_2)
-                button_2_text = font_button.render(self.button2, True, WHITE)
-                button_2_text_rect = button_2_text.get_rect(center=button_2.center)
-                window.blit(button_2_text, button_2_text_rect)
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    pygame.quit()
-                    exit()
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        if self.escape_behaviour == "continue":
-                            return
-                        elif self.escape_behaviour == "exit":
-                            pygame.quit()
-                            exit()
-                    elif event.key == pygame.K_SPACE:
-                        return
-                elif event.type == pygame.MOUSEBUTTONDOWN:
-                    mouse_pos = pygame.mouse.get_pos()
-                    if button_1 and button_1.collidepoint(mouse_pos):
-                        return
-                    elif button_2 and button_2.collidepoint(mouse_pos):
-                        pygame.quit()
-                        exit()
-            pygame.display.update()
-            clock.tick(FPS)
-
-
-map_1 = [
-    [Cell("wall", CELL_SPRITES['WALL-SIDE-N-W'])] + [Cell("wall", CELL_SPRITES['WALL-SIDE-S-N']) for _ in range(14)] + [
-        Cell("wall", CELL_SPRITES['WALL-SIDE-N-E'])]]
-for _ in range(7):
-    map_1.append([Cell("wall", CELL_SPRITES['WALL-SIDE-E-W'])] + [Cell() for _ in range(14)] + [
-        Cell("wall", CELL_SPRITES['WALL-SIDE-W-E'])])
-map_1.append(
-    [Cell("wall", CELL_SPRITES['WALL-SIDE-S-W'])] + [Cell("wall", CELL_SPRITES['WALL-SIDE-N-S']) for _ in range(14)] + [
-        Cell("wall", CELL_SPRITES['WALL-SIDE-S-E'])])
-map_1[3][3], map_1[5][12] = (Cell("wall", CELL_SPRITES['OBSTACLE']) for _ in range(2))
-
-map_2 = [
-    [Cell("wall", CELL_SPRITES["WALL-BACKGROUND"]) for _ in range(7)] + [Cell("wall", CELL_SPRITES['WALL-SIDE-S-N']) for
-                                                                         _ in range(7)] + [
-        Cell("wall", CELL_SPRITES['WALL-SIDE-N-E'])] + [Cell("wall", CELL_SPRITES["WALL-BACKGROUND"])],
-    [Cell("wall", CELL_SPRITES['WALL-SIDE-N-W'])] + [Cell("wall", CELL_SPRITES['WALL-SIDE-S-N']) for _ in range(6)] + [
-        Cell() for _ in range(7)] + [Cell("wall", CELL_SPRITES['WALL-SIDE-W-E'])] + [
-        Cell("wall", CELL_SPRITES["WALL-BACKGROUND"])]
-]
-for _ in range(5):
-    map_2.append([Cell("wall", CELL_SPRITES['WALL-SIDE-E-W'])] + [Cell() for _ in range(14)] + [
-        Cell("wall", CELL_SPRITES['WALL-SIDE-W-E'])])
-map_2.append(
-    [Cell("wall", CELL_SPRITES["WALL-BACKGROUND"])] + [Cell("wall", CELL_SPRITES['WALL-SIDE-E-W'])] + [Cell() for _ in
-                                                                                                       range(7)] + [
-        Cell("wall", CELL_SPRITES['WALL-SIDE-N-S']) for _ in range(6)] + [Cell("wall", CELL_SPRITES['WALL-SIDE-S-E'])])
-map_2.append([Cell("wall", CELL_SPRITES["WALL-BACKGROUND"])] + [Cell("wall", CELL_SPRITES['WALL-SIDE-S-W'])] + [
-    Cell("wall", CELL_SPRITES['WALL-SIDE-N-S']) for _ in range(7)] + [Cell("wall", CELL_SPRITES["WALL-BACKGROUND"]) for
-                                                                      _ in range(7)])
-
-map_3 = [
-    [Cell("wall", CELL_SPRITES["WALL-1"]) for _ in range(16)],
-    [Cell("wall", CELL_SPRITES["WALL-1"]) for _ in range(2)] + [Cell("empty", CELL_SPRITES["FLOOR-1"]) for _ in
-                                                                range(12)] + [Cell("wall", CELL_SPRITES["WALL-1"]) for _
-                                                                              in range(2)]
-]
-for _ in range(5):
-    map_3.append(
-        [Cell("wall", CELL_SPRITES["WALL-1"])] + [Cell("empty", CELL_SPRITES["FLOOR-1"]) for _ in range(14)] + [
-            Cell("wall", CELL_SPRITES["WALL-1"])])
-map_3.append([Cell("wall", CELL_SPRITES["WALL-1"]) for _ in range(2)] + [Cell("empty", CELL_SPRITES["FLOOR-1"]) for _ in
-                                                                         range(12)] + [
-                 Cell("wall", CELL_SPRITES["WALL-1"]) for _ in range(2)])
-map_3.append([Cell("wall", CELL_SPRITES["WALL-1"]) for _ in range(16)])
-
-map_4 = [
-    [Cell("wall", CELL_SPRITES['WALL-SIDE-N-W'])] + [Cell("wall", CELL_SPRITES['WALL-SIDE-S-N']) for _ in range(14)] + [
-        Cell("wall", CELL_SPRITES['WALL-SIDE-N-E'])]]
-for _ in range(7):
-    map_4.append([Cell("wall", CELL_SPRITES['WALL-SIDE-E-W'])] + [Cell() for _ in range(14)] + [
-        Cell("wall", CELL_SPRITES['WALL-SIDE-W-E'])])
-map_4.append(
-    [Cell("wall", CELL_SPRITES['WALL-SIDE-S-W'])] + [Cell("wall", CELL_SPRITES['WALL-SIDE-N-S']) for _ in range(14)] + [
-        Cell("wall", CELL_SPRITES['WALL-SIDE-S-E'])])
-map_4[3][3], map_4[5][12], map_4[5][3], map_4[3][12], map_4[3][6], map_4[5][6], map_4[3][9], map_4[5][9] = (Cell("wall", CELL_SPRITES['OBSTACLE']) for _ in range(8))
+        self.buttons = []
+        if button1:
+            self.buttons.append((pygame.Rect(WINDOW_WIDTH // 2 - 150, WINDOW_HEIGHT // 2 + 50, 300, 50), button1,
+                                 GREEN, LIGHT_GREEN, "continue"))
+        if button2:
+            self.buttons.append((pygame.Rect(WINDOW_WIDTH // 2 - 150, WINDOW_HEIGHT // 2 + 120, 300, 50), button2,
+                                 RED, LIGHT_RED, "exit"))
+        self.backdrop = None
+        self.hover = None
+        self.drawn_hover = None
+
+    def render_backdrop(self, surface):
+        self.backdrop = surface.copy()
+        fill_surface = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT), pygame.SRCALPHA)
+        fill_surface.fill((0, 0, 0, 200))
+        self.backdrop.blit(fill_surface, (0, 0))
+        title = render_text(FONT_TITLE, self.title, GOLD)
+        self.backdrop.blit(title, title.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 175)))
+        if self.subtitle != "":
+            subtitle = render_text(FONT_SUBTITLE, self.subtitle)
+            self.backdrop.blit(subtitle, subtitle.get_rect(center=(WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2 - 70)))
+
+    def draw_button(self, surface, index):
+        rect, text, colour, hover_colour, _ = self.buttons[index]
+        pygame.draw.rect(surface, hover_colour if index == self.hover else colour, rect)
+        text_surface = render_text(FONT_BUTTON, text)
+        surface.blit(text_surface, text_surface.get_rect(center=rect.center))
+        return rect
+
+    def draw(self, surface):
+        # Returns the rects that changed, which is none at all while the player does nothing.
+        if self.backdrop is None:
+            self.render_backdrop(surface)
+            surface.blit(self.backdrop, (0, 0))
+            for index in range(len(self.buttons)):
+                self.draw_button(surface, index)
+            self.drawn_hover = self.hover
+            return [surface.get_rect()]
+        if self.hover == self.drawn_hover:
+            return []
+        changed = [index for index in (self.drawn_hover, self.hover) if index is not None]
+        self.drawn_hover = self.hover
+        return [self.draw_button(surface, index) for index in changed]
+
+    def handle(self, event):
+        if event.type == pygame.QUIT:
+            return "exit"
+        elif event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                return self.escape_behaviour
+            elif event.key == pygame.K_SPACE:
+                return "continue"
+        elif event.type == pygame.MOUSEMOTION:
+            self.hover = self.button_at(event.pos)
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            index = self.button_at(event.pos)
+            if index is not None:
+                return self.buttons[index][4]
+        return None
+
+    def button_at(self, position):
+        for index, (rect, *_) in enumerate(self.buttons):
+            if rect.collidepoint(position):
+                return index
+        return None
+
+
+def build_levels(start_points=0):
+    return campaign.build_levels(start_points, Level, ArcadeLevel, frozenset(SPRITE_IDS))
 
 
 if __name__ == "__main__":
+    # main.py [level] [start points] plays the game, main.py --replay FILE [speed] plays a recorded game back.
+    # A speed of 0 re-simulates the replay without a window and prints where it ended.
+    # main.py --autopilot [level] lets the autopilot play on its own, for demos and soak tests.
+    replay = None
+    autopilot = len(sys.argv) > 1 and sys.argv[1] == "--autopilot"
+    speed = 1.0
+    if len(sys.argv) > 2 and sys.argv[1] == "--replay":
+        replay = Replay.load(sys.argv[2])
+        speed = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+        if speed == 0:
+            game = replay_game(replay, build_levels(replay.start_score))
+            print(f"{len(replay)} ticks, level {game.level.level_number}, score {game.level.score}, "
+                  f"last score {game.last_score}")
+            exit()
+
     pygame.init()
     pygame.display.set_caption("Snake Game")
     window = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
     clock = pygame.time.Clock()
-    apple_sound = pygame.mixer.Sound(sound_apple)
-    game_over_sound = pygame.mixer.Sound(sound_death)
-    level_start = pygame.mixer.Sound(sound_start)
-    level_up_sound = pygame.mixer.Sound(sound_level_up)
-
-    MenuScreen("Snake", "by Falisz, 2023", "Play!", "Exit!").show()
-
-    selected_level = int(sys.argv[1]) if len(sys.argv) > 1 else 1
-    start_points = int(sys.argv[2]) if len(sys.argv) > 2 else 0
-
-    level_1 = Level(1, map_1, 8, 1, start_points, 10, None)
-    level_2 = Level(2, map_2, 10, 2, start_points, 20, None)
-    level_3 = Level(3, map_3, 8, 4, start_points, 40, None, 0.6, 0.7, 0.15)
-    level_4 = Level(4, map_2, 10, 2, start_points, 60, None, 0.2, 0.2, 0.7, 2)
-    level_5 = Level(5, map_4, 8, 2, start_points, 80, None, 0.25, 0.25, 0.5, 2)
-    level_1.next_level = level_2
-    level_2.next_level = level_3
-    level_3.next_level = level_4
-    level_4.next_level = level_5
-    level_0 = ArcadeLevel(0, map_1, 8, 4, 0.5, 0.9, 0.1, 4)
-    levels = {
-        1: level_1,
-        2: level_2,
-        3: level_3,
-        4: level_4,
-        5: level_5,
-        0: level_0
-    }
-    current_level = levels[selected_level]
+    load_fonts()
+    sounds.preload()
+
+    # The menu on screen, if any, and the volume of the level's start sound when it is continued (None for none).
+    menu = None
+    menu_volume = None
+    recorder = None
+    if replay:
+        atlas.load()
+        game = engine.Game(build_levels(replay.start_score), replay.level_number, replay.seed)
+        directions = ReplayInput(replay)
+    elif autopilot:
+        atlas.load()
+        game = engine.Game(build_levels(), int(sys.argv[2]) if len(sys.argv) > 2 else None)
+        directions = AutopilotInput(game)
+    else:
+        selected_level = int(sys.argv[1]) if len(sys.argv) > 1 else campaign.FIRST_LEVEL
+        start_points = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+        game = engine.Game(build_levels(start_points), selected_level)
+        directions = DirectionQueue()
+        atexit.register(save_replay, game)
+        recorder = SessionRecorder(ScoreStore(scores_path), game)
+        atexit.register(close_scores, recorder)
+        menu = MenuScreen("Snake", "by Falisz, 2023", "Play!", "Exit!")
+        menu_volume = 0.5
 
     window.fill(BLACK)
-    level_start.play()
-    level_start.set_volume(0.5)
-    current_level.level_music.play()
-    current_level.level_music.set_volume(0.15)
-    paused = False
+    if not menu:
+        game.level.play(0.5)
+    full_redraw = True
+    overlay = ProfilerOverlay()
+    previous_time = time.perf_counter()
+    lag = 0.0
 
     while True:
-        for event in pygame.event.get():
+        if menu:
+            # Nothing moves behind a menu, so the loop sleeps in event.wait until the player does something.
+            pygame.display.update(menu.draw(window))
+            choice = None
+            for event in [pygame.event.wait()] + pygame.event.get():
+                choice = choice or menu.handle(event)
+            if choice == "exit":
+                pygame.quit()
+                exit()
+            elif choice == "continue":
+                menu = None
+                if not atlas.is_loaded():
+                    atlas.load()
+                if menu_volume is not None:
+                    game.level.play(menu_volume)
+                full_redraw = True
+                directions.clear()
+                previous_time = time.perf_counter()
+                lag = 0.0
+            continue
+
+        with profiler.phase("events"):
+            pending_events = pygame.event.get()
+        for event in pending_events:
             if event.type == pygame.QUIT:
                 pygame.quit()
                 exit()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
-                    if not paused:
-                        MenuScreen("Paused!", "", "Resume!", "Exit the game!").show()
-                        paused = False
-
-        if not paused:
-            current_level.draw_level()
-            current_level.draw_apples()
-            current_level.draw_score()
-            current_level.snake.update(pygame.key.get_pressed())
-            current_level.snake.draw()
-            pygame.display.update()
-
-            for apple in current_level.apples:
-                if current_level.snake.head.x == apple.x and current_level.snake.head.y == apple.y:
-                    apple_sound.play()
-                    apple_sound.set_volume(0.3)
-                    apple.eat_effect()
-                    apple.kill()
-                    pygame.display.update()
-                    current_level.draw_level()
-                    current_level.draw_score()
-                    current_level.spawn_apples()
-                    current_level.draw_apples()
-
-            if current_level.apples_clock >= current_level.apples_timer:
-                current_level.spawn_apples()
-                current_level.draw_apples()
-
-            if current_level.score >= current_level.score_to_level_up > 0:
-                current_level.level_up()
-                last_score = current_level.score
-                if current_level.is_final_level():
-                    MenuScreen("Congratulations!", "Thanks for playing!", "Play Arcade Mode!", "Exit the game!",
-                               "exit").show()
-                    current_level = levels[0]
-                    current_level.start(last_score)
+                    menu = MenuScreen("Paused!", "", "Resume!", "Exit the game!")
+                    menu_volume = None
+                    break
+                elif event.key == pygame.K_F3:
+                    overlay.toggle()
+                elif event.key == pygame.K_F4:
+                    overlay.save()
                 else:
-                    MenuScreen("Good job!", "You've completed the level!", "Continue!").show()
-                    current_level = current_level.next_level
-                    current_level.start(last_score)
-
-            if isinstance(current_level, ArcadeLevel):
-                if current_level.map[current_level.snake.head.y][current_level.snake.head.x].cell_type == "wall" or current_level.snake.head.x == current_level.snake.tail.x and current_level.snake.head.y == current_level.snake.tail.y:
-                    current_level.game_over(f"You've scored {current_level.score}", "Replay arcade!")
-                    current_level.start()
-                for segment in current_level.snake.segments:
-                    if current_level.snake.head.x == segment.x and current_level.snake.head.y == segment.y:
-                        current_level.game_over(f"You've scored {current_level.score}", "Replay arcade!")
-                        current_level.start()
+                    directions.push(event.key)
+        if menu:
+            continue
+
+        now = time.perf_counter()
+        lag += min(now - previous_time, MAX_FRAME_TIME)
+        previous_time = now
+
+        # The game logic steps at the level's tick rate, however often the screen is redrawn.
+        while lag >= 1 / (game.level.tick_rate * speed):
+            lag -= 1 / (game.level.tick_rate * speed)
+            if replay and game.ticks == len(replay):
+                pygame.quit()
+                exit()
+            current_level = game.level
+            current_level.head_from = (current_level.snake.x, current_level.snake.y)
+            with profiler.phase("game.step"):
+                events = game.step(directions.pop(current_level.snake))
+            if recorder:
+                recorder.step(current_level, events)
+            if game.level is not current_level:
+                full_redraw = True
+
+            for event in events:
+                if event.kind == APPLE_EATEN:
+                    sounds.play("apple", 0.3)
+                elif replay or autopilot:
+                    game.level.play()
+                    full_redraw = True
+                elif event.kind in GAME_OVER_EVENTS:
+                    if isinstance(current_level, ArcadeLevel):
+                        # The run was only just queued for the store, so it may not be in best() yet.
+                        best = max(recorder.store.best(current_level.level_number) or 0, game.last_score)
+                        menu = current_level.game_over(f"You've scored {game.last_score}, best {best}", "Replay arcade!")
+                    else:
+                        menu = current_level.game_over(*GAME_OVER_MESSAGES[event.kind])
+                    menu_volume = 0.6
+                elif event.kind == LEVEL_UP:
+                    current_level.level_up()
+                    menu = MenuScreen("Good job!", "You've completed the level!", "Continue!")
+                    menu_volume = 0.6
+                elif event.kind == GAME_COMPLETED:
+                    current_level.level_up()
+                    menu = MenuScreen("Congratulations!", "Thanks for playing!", "Play Arcade Mode!", "Exit the game!",
+                                      "exit")
+                    menu_volume = 0.6
+
+            if full_redraw or menu:
+                game.level.head_from = (game.level.snake.x, game.level.snake.y)
+                directions.clear()
+                previous_time = time.perf_counter()
+                lag = 0.0
+                break
+        if menu:
+            continue
+
+        alpha = min(lag * game.level.tick_rate * speed, 1.0)
+        with profiler.phase("render"):
+            if full_redraw or overlay.stale:
+                overlay.stale = False
+                rects = game.level.draw(alpha=alpha)
             else:
-                if current_level.map[current_level.snake.head.y][current_level.snake.head.x].cell_type == "wall":
-                    current_level.game_over("You've hit the wall!", "Replay the level")
-                    current_level.start()
-                for segment in current_level.snake.segments:
-                    if current_level.snake.head.x == segment.x and current_level.snake.head.y == segment.y:
-                        current_level.game_over("You've bitten your tail!", "Start over")
-                        current_level = levels[1]
-                        current_level.start()
-                if current_level.snake.head.x == current_level.snake.tail.x and current_level.snake.head.y == current_level.snake.tail.y:
-                    current_level.game_over("You've bitten yourself!", "Start over")
-                    current_level = levels[1]
-                    current_level.start()
-
-            clock.tick(FPS)
-            current_level.apples_clock += FPS
+                rects = game.level.redraw(alpha=alpha)
+            if profiler.enabled:
+                rects.append(overlay.draw(window))
+        with profiler.phase("display.update"):
+            pygame.display.update(rects)
+        full_redraw = False
+
+        music.update()
+        with profiler.phase("idle"):
+            clock.tick(RENDER_FPS)
@@ -0,0 +1,104 @@
+import functools
+
+# Level maps are two byte layers of width * height cells: the tile types the rules care about and the index
+# of each cell's sprite in the map's palette of sprite names. On disk a map is ASCII art with a legend:
+#
+#   # comment
+#   . empty GRASS
+#   o wall OBSTACLE
+#
+#   ooooo
+#   o...o
+#   ooooo
+#
+# Every legend line gives a character, its tile type and its sprite name, and a blank line ends the legend.
+# The border must be walls all round, so a snake's head never leaves the map.
+
+# TILES
+EMPTY = 0
+WALL = 1
+TILE_TYPES = {"empty": EMPTY, "wall": WALL}
+
+
+class LevelMap:
+    __slots__ = ("width", "height", "tiles", "sprites", "palette")
+
+    def __init__(self, width, height, tiles=None, sprites=None, palette=(None,)):
+        self.width = width
+        self.height = height
+        self.tiles = tiles or bytearray(width * height)
+        self.sprites = sprites or bytearray(width * height)
+        self.palette = palette
+
+    def is_wall(self, x, y):
+        return self.tiles[y * self.width + x] == WALL
+
+    def wall_cells(self):
+        for cell, tile in enumerate(self.tiles):
+            if tile == WALL:
+                yield cell % self.width, cell // self.width
+
+    def sprite(self, x, y):
+        return self.palette[self.sprites[y * self.width + x]]
+
+
+def walled_map(width, height, wall_sprite=None, floor_sprite=None):
+    tiles = bytearray(width * height)
+    tiles[:width] = tiles[-width:] = bytes([WALL]) * width
+    tiles[::width] = tiles[width - 1::width] = bytes([WALL]) * height
+    # The palette is (floor, wall), so the sprite layer is a copy of the tile layer.
+    return LevelMap(width, height, tiles, bytearray(tiles), (floor_sprite, wall_sprite))
+
+
+def parse_map(text, name="<map>", sprite_names=None):
+    legend = {}
+    palette = []
+    lines = iter(enumerate(text.splitlines(), 1))
+    for number, line in lines:
+        if line.startswith("#"):
+            continue
+        if not line.strip():
+            if legend:
+                break
+            continue
+        fields = line.split()
+        if len(fields) != 3 or len(fields[0]) != 1:
+            raise ValueError(f"{name}:{number}: legend lines are '<character> <tile type> <sprite name>'")
+        char, tile_type, sprite_name = fields
+        if tile_type not in TILE_TYPES:
+            raise ValueError(f"{name}:{number}: unknown tile type {tile_type!r}")
+        if sprite_names is not None and sprite_name not in sprite_names:
+            raise ValueError(f"{name}:{number}: unknown sprite {sprite_name!r}")
+        if sprite_name not in palette:
+            palette.append(sprite_name)
+        legend[ord(char)] = (TILE_TYPES[tile_type], palette.index(sprite_name))
+
+    rows = [(number, line.rstrip("\n")) for number, line in lines if line.strip()]
+    if not rows:
+        raise ValueError(f"{name}: the map has no rows")
+    width = len(rows[0][1])
+    level_map = LevelMap(width, len(rows), palette=tuple(palette))
+    for y, (number, row) in enumerate(rows):
+        if len(row) != width:
+            raise ValueError(f"{name}:{number}: the row is {len(row)} cells wide instead of {width}")
+        for x, char in enumerate(row.encode("ascii", "replace")):
+            if char not in legend:
+                raise ValueError(f"{name}:{number}: {chr(char)!r} is not in the legend")
+            level_map.tiles[y * width + x], level_map.sprites[y * width + x] = legend[char]
+    if WALL not in level_map.tiles or EMPTY not in level_map.tiles:
+        raise ValueError(f"{name}: a map needs both walls and empty cells")
+    tiles = level_map.tiles
+    border = tiles[:width] + tiles[-width:] + tiles[::width] + tiles[width - 1::width]
+    if EMPTY in border:
+        cell = next(cell for cell, tile in enumerate(tiles) if tile == EMPTY and (
+            cell < width or cell >= len(tiles) - width or cell % width in (0, width - 1)))
+        raise ValueError(f"{name}:{rows[cell // width][0]}: the border has an empty cell at column {cell % width + 1},"
+                         f" a map needs walls all round")
+    return level_map
+
+
+@functools.lru_cache(maxsize=None)
+def load_map(path, sprite_names=None):
+    # Maps are read the first time a level asks for them and shared by every level that uses them after that.
+    with open(path, encoding="ascii") as file:
+        return parse_map(file.read(), path, sprite_names)
@@ -0,0 +1,381 @@
+import argparse
+import asyncio
+import collections
+import random
+import struct
+
+import campaign
+from engine import APPLE_EATEN, FPS, OPPOSITE, Apple, CollisionMap, Snake
+from maps import walled_map
+
+# Several snakes on one map, simulated by an asyncio server and played by remote clients over TCP.
+#
+# Each room runs its Arena at a fixed tick rate. Clients send one byte per key press, the direction to turn to.
+# Every message from the server is framed by its length. A client first gets a HELLO with its player number and
+# the map's tile layer, then a SNAPSHOT every tick. A snapshot only lists the cells whose content changed since
+# the previous tick, followed by every player's head, tail, direction and score. A client's first snapshot
+# lists every non-empty cell.
+#
+#   python multiplayer.py serve --port 7777 --map 64x36
+#   python multiplayer.py bots 8 --port 7777
+
+# MESSAGES
+FRAME = struct.Struct("<I")
+HELLO = struct.Struct("<BBHHH")
+SNAPSHOT = struct.Struct("<BIHB")
+CELL = struct.Struct("<IB")
+PLAYER = struct.Struct("<BIIBi")
+HELLO_MESSAGE = 0
+SNAPSHOT_MESSAGE = 1
+
+# CELL CONTENTS
+EMPTY = 0
+APPLE = 1
+FIRST_PLAYER = 2
+MAX_PLAYERS = 254 - FIRST_PLAYER
+
+RESPAWN_TICKS = FPS
+MAX_WRITE_BUFFER = 1 << 16
+
+
+class Player:
+    def __init__(self, number):
+        self.number = number
+        self.code = FIRST_PLAYER + number
+        self.snake = None
+        self.alive = False
+        self.respawn_tick = 0
+        self.score = 0
+        self.directions = collections.deque(maxlen=3)
+
+    def next_direction(self):
+        while self.directions:
+            direction = self.directions.popleft()
+            if direction != self.snake.direction and direction != OPPOSITE[self.snake.direction]:
+                return direction
+        return None
+
+
+class Arena:
+    # The multiplayer rules: every snake moves at once and dies if its head runs into a wall, another snake or
+    # itself, or eats the apple it lands on; two heads meeting kill both. Dead snakes leave the board and respawn
+    # after RESPAWN_TICKS with their score reset. Every apple is a plain one, worth a point and a cell of growth.
+    # The players' codes are their snakes' owners in the collision map.
+    def __init__(self, level_map, seed=None, apples_number=None):
+        self.map = level_map
+        self.width = level_map.width
+        self.height = level_map.height
+        self.grid = CollisionMap(self.width, self.height, level_map.tiles)
+        self.random = random.Random(seed)
+        self.players = {}
+        self.apples_number = apples_number or max(len(self.grid.free) // 200, 1)
+        self.board = bytearray(self.width * self.height)
+        self.touched = set()
+        self.ticks = 0
+        self.spawn_apples()
+
+    def add_player(self):
+        number = next(number for number in range(MAX_PLAYERS) if number not in self.players)
+        player = self.players[number] = Player(number)
+        self.spawn_snake(player)
+        return player
+
+    def remove_player(self, player):
+        if player.alive:
+            self.release(player)
+        del self.players[player.number]
+
+    def spawn_snake(self, player):
+        # A new snake is two cells facing down, with the cell in front of it free.
+        for _ in range(100):
+            if self.grid.is_full():
+                break
+            x, y = self.grid.random_free(self.random)
+            if 0 < y < self.height - 1 and self.grid.is_free(x, y - 1) and self.grid.is_free(x, y + 1):
+                if player.snake is None:
+                    player.snake = Snake(x, y, self.grid, owner=player.code)
+                else:
+                    player.snake.place(x, y)
+                self.touched.update((y * self.width + x, (y - 1) * self.width + x))
+                player.alive = True
+                player.score = 0
+                player.directions.clear()
+                return
+        player.respawn_tick = self.ticks + 1
+
+    def release(self, player):
+        for entry in player.snake.entries():
+            cell = entry >> 4
+            self.grid.release(cell % self.width, cell // self.width, player.code)
+            self.touched.add(cell)
+        player.alive = False
+
+    def spawn_apples(self):
+        while len(self.grid.apples) < self.apples_number and not self.grid.is_full():
+            apple = Apple(self)
+            self.grid.add_apple(apple)
+            self.touched.add(apple.y * self.width + apple.x)
+
+    def step(self):
+        # Returns the tick's events.
+        moves = []
+        for player in self.players.values():
+            if player.alive:
+                snake = player.snake
+                tail_cells = [entry >> 4 for _, entry in zip(range(2), snake.entries())]
+                length = len(snake)
+                snake.update(player.next_direction())
+                moves.append((player.code, snake.x, snake.y, snake.tail_cell()))
+                self.touched.add(snake.head_cell())
+                self.touched.update(tail_cells[:length + 1 - len(snake)])
+
+        events = self.grid.move(moves)
+        for event in events:
+            player = self.players[event.snake - FIRST_PLAYER]
+            if event.kind == APPLE_EATEN:
+                self.grid.release(event.other.x, event.other.y)
+                player.score += 1
+                player.snake.grow(1)
+            elif player.alive:
+                self.release(player)
+                player.respawn_tick = self.ticks + RESPAWN_TICKS
+
+        self.ticks += 1
+        for player in self.players.values():
+            if not player.alive and player.respawn_tick <= self.ticks:
+                self.spawn_snake(player)
+        self.spawn_apples()
+        return events
+
+    def content(self, cell):
+        if cell in self.grid.apples:
+            return APPLE
+        return self.grid.owners[cell]
+
+    def hello(self, player, tick_rate):
+        return frame(HELLO.pack(HELLO_MESSAGE, player.number, self.width, self.height, tick_rate) + self.map.tiles)
+
+    def snapshot(self, cells):
+        # A player whose first spawn is still waiting for room has no snake yet, so isn't listed until it has one.
+        players = [player for player in self.players.values() if player.snake is not None]
+        parts = [SNAPSHOT.pack(SNAPSHOT_MESSAGE, self.ticks, len(cells), len(players))]
+        parts.extend(CELL.pack(cell, content) for cell, content in cells)
+        parts.extend(PLAYER.pack(player.number, player.snake.head_cell(), player.snake.tail_cell(),
+                                 player.snake.direction | player.alive << 2, player.score) for player in players)
+        return frame(b"".join(parts))
+
+    def delta(self):
+        # The cells touched this tick whose content differs from what the clients were last sent.
+        cells = []
+        for cell in self.touched:
+            content = self.content(cell)
+            if self.board[cell] != content:
+                self.board[cell] = content
+                cells.append((cell, content))
+        self.touched.clear()
+        return self.snapshot(cells)
+
+    def keyframe(self):
+        return self.snapshot([(cell, content) for cell, content in enumerate(self.board) if content])
+
+
+def frame(payload):
+    return FRAME.pack(len(payload)) + payload
+
+
+class Room:
+    def __init__(self, number, level_map, tick_rate=FPS, max_players=8, seed=None):
+        self.number = number
+        self.arena = Arena(level_map, seed)
+        self.tick_rate = tick_rate
+        self.max_players = max_players
+        self.clients = {}
+        self.task = None
+        self.sent_bytes = 0
+
+    def is_full(self):
+        return len(self.clients) >= self.max_players
+
+    def join(self, writer):
+        # The keyframe is the board as last sent to everyone, so the new snake's cells reach the new client in the
+        # next tick's snapshot along with everybody else.
+        player = self.arena.add_player()
+        writer.write(self.arena.hello(player, self.tick_rate) + self.arena.keyframe())
+        self.clients[player] = writer
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return player
+
+    def leave(self, player):
+        self.clients.pop(player, None)
+        self.arena.remove_player(player)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while self.clients:
+            self.arena.step()
+            message = self.arena.delta()
+            for writer in list(self.clients.values()):
+                # A client that can't keep up is dropped instead of letting its backlog grow without limit.
+                if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                    writer.close()
+                else:
+                    writer.write(message)
+                    self.sent_bytes += len(message)
+            next_tick += 1 / self.tick_rate
+            await asyncio.sleep(max(next_tick - loop.time(), 0))
+        self.task = None
+
+
+class Server:
+    def __init__(self, level_map, tick_rate=FPS, max_players=8, seed=None):
+        self.level_map = level_map
+        self.tick_rate = tick_rate
+        self.max_players = max_players
+        self.seed = seed
+        self.rooms = []
+
+    def room_with_space(self):
+        for room in self.rooms:
+            if not room.is_full():
+                return room
+        seed = None if self.seed is None else self.seed + len(self.rooms)
+        room = Room(len(self.rooms), self.level_map, self.tick_rate, self.max_players, seed)
+        self.rooms.append(room)
+        return room
+
+    async def handle(self, reader, writer):
+        room = self.room_with_space()
+        player = room.join(writer)
+        try:
+            while True:
+                data = await reader.read(64)
+                if not data:
+                    break
+                player.directions.extend(value for value in data if value < 4)
+        except ConnectionError:
+            pass
+        finally:
+            room.leave(player)
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=0):
+        return await asyncio.start_server(self.handle, host, port)
+
+
+class Client:
+    # Keeps a copy of the board from the server's messages and steers with a policy of (client, rng) -> direction.
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.player = None
+        self.width = 0
+        self.height = 0
+        self.tiles = b""
+        self.board = bytearray()
+        self.players = {}
+        self.ticks = 0
+        self.received_bytes = 0
+        self.snapshots = 0
+
+    async def connect(self, host, port):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        payload = await self.read_message()
+        _, self.player, self.width, self.height, _ = HELLO.unpack_from(payload)
+        self.tiles = payload[HELLO.size:]
+        self.board = bytearray(self.width * self.height)
+
+    async def read_message(self):
+        header = await self.reader.readexactly(FRAME.size)
+        payload = await self.reader.readexactly(FRAME.unpack(header)[0])
+        self.received_bytes += FRAME.size + len(payload)
+        return payload
+
+    def apply(self, payload):
+        _, self.ticks, cells, players = SNAPSHOT.unpack_from(payload)
+        offset = SNAPSHOT.size
+        for cell, content in CELL.iter_unpack(payload[offset:offset + cells * CELL.size]):
+            self.board[cell] = content
+        offset += cells * CELL.size
+        self.players = {number: (head, tail, state & 3, bool(state >> 2), score) for number, head, tail, state, score
+                        in PLAYER.iter_unpack(payload[offset:offset + players * PLAYER.size])}
+        self.snapshots += 1
+
+    def send(self, direction):
+        self.writer.write(bytes((direction,)))
+
+    async def play(self, policy, rng, ticks=None):
+        try:
+            while ticks is None or self.snapshots < ticks:
+                self.apply(await self.read_message())
+                direction = policy(self, rng)
+                if direction is not None:
+                    self.send(direction)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    def close(self):
+        self.writer.close()
+
+
+def wandering_policy(client, rng):
+    # Turns at random now and then, and away from anything directly in front of its head.
+    if client.player not in client.players:
+        return None
+    head, _, direction, alive, _ = client.players[client.player]
+    if not alive:
+        return None
+    x, y = head % client.width, head // client.width
+    moves = {0: (x, y - 1), 1: (x, y + 1), 2: (x - 1, y), 3: (x + 1, y)}
+    safe = [option for option, (move_x, move_y) in moves.items() if option != OPPOSITE[direction]
+            and 0 <= move_x < client.width and 0 <= move_y < client.height
+            and not client.tiles[move_y * client.width + move_x]
+            and client.board[move_y * client.width + move_x] in (EMPTY, APPLE)]
+    if direction in safe and rng.random() > 0.1:
+        return None
+    return rng.choice(safe) if safe else None
+
+
+def arena_map(name):
+    if "x" in name:
+        width, height = (int(size) for size in name.split("x"))
+        return walled_map(width, height, "WALL-1", "GRASS")
+    return campaign.level_map(name)
+
+
+async def serve(args):
+    server = Server(arena_map(args.map), args.tick_rate, args.room_size, args.seed)
+    tcp_server = await server.start(args.host, args.port)
+    print(f"Serving {args.map} on {', '.join(str(socket.getsockname()) for socket in tcp_server.sockets)}")
+    async with tcp_server:
+        await tcp_server.serve_forever()
+
+
+async def bots(args):
+    clients = [Client() for _ in range(args.count)]
+    for client in clients:
+        await client.connect(args.host, args.port)
+    await asyncio.gather(*(client.play(wandering_policy, random.Random(number))
+                           for number, client in enumerate(clients)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multiplayer snake server and bot clients.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve")
+    serve_parser.add_argument("--map", default="64x36", help="a campaign map name, or WIDTHxHEIGHT for a walled field")
+    serve_parser.add_argument("--tick-rate", type=int, default=FPS)
+    serve_parser.add_argument("--room-size", type=int, default=8)
+    serve_parser.add_argument("--seed", type=int)
+    bots_parser = commands.add_parser("bots")
+    bots_parser.add_argument("count", type=int)
+    for command in (serve_parser, bots_parser):
+        command.add_argument("--host", default="127.0.0.1")
+        command.add_argument("--port", type=int, default=7777)
+    args = parser.parse_args()
+    asyncio.run(serve(args) if args.command == "serve" else bots(args))
+
+
+if __name__ == "__main__":
+    main()
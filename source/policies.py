@@ -0,0 +1,155 @@
+from array import array
+
+from engine import MOVES, OPPOSITE, WitheredApple
+
+# Scripted players for headless games. A policy looks at a level and returns the direction to turn to this
+# tick, or None to keep going straight; rng is the policy's own random.Random, separate from the game's.
+
+
+def is_safe(level, direction):
+    snake = level.snake
+    x, y = snake.x + MOVES[direction][0], snake.y + MOVES[direction][1]
+    if not (0 <= x < level.width and 0 <= y < level.height) or level.is_wall(x, y):
+        return False
+    count = level.grid.count(x, y) - sum(1 for apple in level.apples if apple.x == x and apple.y == y)
+    # The tail moves out of the way this tick unless the snake is growing.
+    return count == 0 or (count == 1 and y * level.width + x == snake.tail_cell() and snake.grow_count <= 0)
+
+
+def random_policy(level, rng):
+    return rng.choice((None, None, None) + tuple(direction for direction in range(4)
+                                                 if direction != OPPOSITE[level.snake.direction]))
+
+
+def greedy_policy(level, rng):
+    # Heads for the nearest apple along safe cells, ignoring everything further than one move ahead.
+    snake = level.snake
+    directions = [direction for direction in range(4) if direction != OPPOSITE[snake.direction]]
+    safe = [direction for direction in directions if is_safe(level, direction)] or directions
+    if not level.apples:
+        return rng.choice(safe)
+
+    def distance(direction):
+        x, y = snake.x + MOVES[direction][0], snake.y + MOVES[direction][1]
+        return min(abs(apple.x - x) + abs(apple.y - y) for apple in level.apples), rng.random()
+
+    return min(safe, key=distance)
+
+
+class Autopilot:
+    # Follows a BFS distance field to the nearest apple that is not withered. The field only goes around walls and
+    # withered apples, so it stays valid while the snake moves and is only restarted when the apples change. It is
+    # also grown lazily, one distance at a time, just far enough to rank the cells next to the head, and by at
+    # most SEARCH_BUDGET cells per tick; until it gets there the autopilot steers by Manhattan distance.
+    # The snake's own body is handled per move instead: a move is taken only if the cells reachable after it reach
+    # the tail or hold ROOM_LIMIT cells, so the snake doesn't wall itself in. With no apple to go for, it chases its tail.
+    ROOM_LIMIT = 2048
+    SEARCH_BUDGET = 5000
+
+    def __init__(self):
+        self.key = None
+        self.field = None
+        self.queue = []
+        self.position = 0
+        self.apple_cells = set()
+        self.withered_cells = set()
+        self.targets = []
+
+    def __call__(self, level, rng=None):
+        key = (id(level), tuple((apple.x, apple.y) for apple in level.apples))
+        if key != self.key:
+            self.key = key
+            self.start_field(level)
+
+        snake = level.snake
+        width = level.width
+        tail = snake.tail_cell()
+        moves = []
+        for direction in range(4):
+            if direction != OPPOSITE[snake.direction] and is_safe(level, direction):
+                moves.append((direction, (snake.y + MOVES[direction][1]) * width + snake.x + MOVES[direction][0]))
+        distances = self.distances(level, [cell for _, cell in moves])
+        candidates = []
+        for (direction, cell), distance in zip(moves, distances):
+            x, y = cell % width, cell // width
+            tail_distance = abs(x - tail % width) + abs(y - tail // width)
+            candidates.append((cell in self.withered_cells, distance, tail_distance, direction, cell))
+        candidates.sort()
+        for _, _, _, direction, cell in candidates:
+            if self.has_room(level, cell):
+                return direction
+        return candidates[0][3] if candidates else None
+
+    def start_field(self, level):
+        width = level.width
+        self.apple_cells = {apple.y * width + apple.x for apple in level.apples}
+        self.withered_cells = {apple.y * width + apple.x for apple in level.apples if isinstance(apple, WitheredApple)}
+        self.targets = [(cell % width, cell // width) for cell in self.apple_cells - self.withered_cells]
+        self.field = array("i", [-1]) * (width * level.height)
+        # Withered apples are marked as visited, and so as far away as possible, to keep the search off them.
+        for cell in self.withered_cells:
+            self.field[cell] = len(self.field)
+        self.queue = [y * width + x for x, y in self.targets]
+        for cell in self.queue:
+            self.field[cell] = 0
+        self.position = 0
+
+    def distances(self, level, cells):
+        width = level.width
+        walls = level.grid.walls
+        field = self.field
+        queue = self.queue
+        size = len(field)
+        budget = self.SEARCH_BUDGET
+        while self.position < len(queue):
+            # Every cell up to the frontier's distance is labelled, so once a cell next to the head has a label
+            # no further than that, none of the unlabelled ones can beat it.
+            frontier = field[queue[self.position]]
+            known = [field[cell] for cell in cells if field[cell] >= 0]
+            if len(known) == len(cells) or (known and min(known) <= frontier):
+                break
+            if budget <= 0:
+                return [min(abs(cell % width - x) + abs(cell // width - y) for x, y in self.targets) for cell in cells]
+            while self.position < len(queue) and field[queue[self.position]] == frontier:
+                cell = queue[self.position]
+                self.position += 1
+                budget -= 1
+                x = cell % width
+                for neighbour in (cell - width if cell >= width else -1, cell + width if cell < size - width else -1,
+                                  cell - 1 if x > 0 else -1, cell + 1 if x < width - 1 else -1):
+                    if neighbour >= 0 and field[neighbour] < 0 and not walls[neighbour]:
+                        field[neighbour] = frontier + 1
+                        queue.append(neighbour)
+        return [field[cell] if field[cell] >= 0 else size for cell in cells]
+
+    def has_room(self, level, start):
+        width = level.width
+        size = width * level.height
+        walls = level.grid.walls
+        cells = level.grid.cells
+        apple_cells = self.apple_cells
+        tail = level.snake.tail_cell()
+        limit = min(len(level.snake), self.ROOM_LIMIT)
+        seen = {start}
+        stack = [start]
+        while stack:
+            cell = stack.pop()
+            x = cell % width
+            for neighbour in (cell - width, cell + width, cell - 1 if x > 0 else -1, cell + 1 if x < width - 1 else -1):
+                if neighbour == tail:
+                    return True
+                if neighbour < 0 or neighbour >= size or neighbour in seen or walls[neighbour] or \
+                        cells[neighbour] > (neighbour in apple_cells):
+                    continue
+                seen.add(neighbour)
+                if len(seen) >= limit:
+                    return True
+                stack.append(neighbour)
+        return False
+
+
+POLICIES = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+    "autopilot": Autopilot(),
+}
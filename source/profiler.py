@@ -0,0 +1,112 @@
+import collections
+import contextlib
+import functools
+import json
+import time
+
+# Opt-in timing of the game's phases. While the profiler is off, phase() hands back one shared no-op context and
+# the instrumented methods are the original, unwrapped functions, so the game pays next to nothing for it.
+# While it is on, every phase keeps its last SAMPLES durations for percentiles, and the last TRACE_EVENTS
+# spans are kept for a Chrome trace (chrome://tracing or ui.perfetto.dev).
+
+SAMPLES = 600
+TRACE_EVENTS = 100000
+NO_PHASE = contextlib.nullcontext()
+
+
+class Phase:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, self.start, time.perf_counter())
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.samples = {}
+        self.trace = collections.deque(maxlen=TRACE_EVENTS)
+        self.methods = []
+        self.origin = time.perf_counter()
+
+    def instrument(self, cls, method_name, phase_name=None):
+        # The method is only wrapped while the profiler is enabled.
+        self.methods.append((cls, method_name, phase_name or f"{cls.__name__}.{method_name}"))
+        if self.enabled:
+            self.wrap(*self.methods[-1])
+
+    def wrap(self, cls, method_name, phase_name):
+        method = cls.__dict__[method_name]
+        phase = self.phase
+
+        @functools.wraps(method)
+        def timed(*args, **kwargs):
+            with phase(phase_name):
+                return method(*args, **kwargs)
+
+        timed.original = method
+        setattr(cls, method_name, timed)
+
+    def enable(self):
+        if not self.enabled:
+            self.enabled = True
+            for cls, method_name, phase_name in self.methods:
+                self.wrap(cls, method_name, phase_name)
+
+    def disable(self):
+        if self.enabled:
+            self.enabled = False
+            for cls, method_name, _ in self.methods:
+                setattr(cls, method_name, cls.__dict__[method_name].original)
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def phase(self, name):
+        if not self.enabled:
+            return NO_PHASE
+        return Phase(self, name)
+
+    def record(self, name, start, end):
+        if name not in self.samples:
+            self.samples[name] = collections.deque(maxlen=SAMPLES)
+        self.samples[name].append(end - start)
+        self.trace.append((name, start, end))
+
+    def percentiles(self):
+        # {phase: (p50, p99, calls kept)} in milliseconds.
+        stats = {}
+        for name, samples in self.samples.items():
+            if samples:
+                ordered = sorted(samples)
+                stats[name] = (ordered[len(ordered) // 2] * 1000, ordered[len(ordered) * 99 // 100] * 1000, len(ordered))
+        return stats
+
+    def chrome_trace(self):
+        return {"traceEvents": [{"name": name, "ph": "X", "pid": 1, "tid": 1, "ts": (start - self.origin) * 1e6,
+                                 "dur": (end - start) * 1e6} for name, start, end in self.trace],
+                "displayTimeUnit": "ms"}
+
+    def save_trace(self, path):
+        with open(path, "w") as file:
+            json.dump(self.chrome_trace(), file)
+
+    def save_csv(self, path):
+        with open(path, "w") as file:
+            file.write("phase,start_ms,duration_ms\n")
+            for name, start, end in self.trace:
+                file.write(f"{name},{(start - self.origin) * 1000:.4f},{(end - start) * 1000:.4f}\n")
+
+
+profiler = Profiler()
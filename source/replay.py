@@ -0,0 +1,59 @@
+import struct
+import zlib
+
+import engine
+
+# A replay is everything needed to play a game again: the game's seed, the level and score it started
+# from and one byte of input per tick. The ticks are zlib-compressed on disk, since most of them are
+# "no input" and a whole session usually fits in a few hundred bytes.
+
+MAGIC = b"SNKR"
+VERSION = 2
+HEADER = struct.Struct("<4sBQBi")
+
+
+class Replay:
+    def __init__(self, seed, level_number=1, start_score=0, inputs=b""):
+        self.seed = seed
+        self.level_number = level_number
+        self.start_score = start_score
+        self.inputs = bytearray(inputs)
+
+    def __len__(self):
+        return len(self.inputs)
+
+    @classmethod
+    def from_game(cls, game):
+        return cls(game.seed, game.level_number, game.start_score, game.inputs)
+
+    def directions(self):
+        for value in self.inputs:
+            yield None if value == 0 else value - 1
+
+    def to_bytes(self):
+        return HEADER.pack(MAGIC, VERSION, self.seed, self.level_number, self.start_score) + zlib.compress(self.inputs, 9)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, seed, level_number, start_score = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not a snake replay, or a replay from another version.")
+        return cls(seed, level_number, start_score, zlib.decompress(data[HEADER.size:]))
+
+    def save(self, path):
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
+
+
+def replay_game(replay, levels):
+    # Re-simulates the whole replay as fast as the engine can step, with no window or clock involved.
+    levels[replay.level_number].score = replay.start_score
+    game = engine.Game(levels, replay.level_number, replay.seed)
+    for direction in replay.directions():
+        game.step(direction)
+    return game
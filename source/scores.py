@@ -0,0 +1,163 @@
+import collections
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+from campaign import ARCADE_LEVEL
+from engine import APPLE_EATEN, GAME_OVER_EVENTS, LEVEL_UP, GAME_COMPLETED
+
+# Best scores, the arcade leaderboard and per-session statistics, kept in SQLite. The game never waits on the
+# database: writes are queued and a background thread commits whatever has piled up in one transaction, and reads
+# go through their own connection, which WAL mode lets run alongside the writer. Every finished run of a level is a
+# row of runs; the index on (level, score) keeps the top of a leaderboard a short index walk however many runs there are.
+#
+# The arcade leaderboard is the runs of level campaign.ARCADE_LEVEL.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    score INTEGER NOT NULL,
+    ticks INTEGER NOT NULL,
+    cause TEXT NOT NULL,
+    seed INTEGER NOT NULL,
+    finished REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_score ON runs (level, score DESC);
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    started REAL NOT NULL,
+    ended REAL
+);
+CREATE TABLE IF NOT EXISTS session_counts (
+    session TEXT NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (session, name)
+) WITHOUT ROWID;
+"""
+INSERT_RUN = "INSERT INTO runs (session, level, score, ticks, cause, seed, finished) VALUES (?, ?, ?, ?, ?, ?, ?)"
+ADD_COUNT = ("INSERT INTO session_counts (session, name, count) VALUES (?, ?, ?) "
+             "ON CONFLICT (session, name) DO UPDATE SET count = count + excluded.count")
+BATCH = 1000
+
+scores_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scores.sqlite3')
+
+
+class ScoreStore:
+    def __init__(self, path):
+        self.path = path
+        self.session = uuid.uuid4().hex
+        self.writes = queue.Queue()
+        connection = self.connect()
+        connection.executescript(SCHEMA)
+        self.reader = connection
+        self.writer = threading.Thread(target=self.write_loop, name="score-writer", daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def write_loop(self):
+        connection = self.connect()
+        while True:
+            writes = [self.writes.get()]
+            while len(writes) < BATCH:
+                try:
+                    writes.append(self.writes.get_nowait())
+                except queue.Empty:
+                    break
+            with connection:
+                for write in writes:
+                    if write is not None:
+                        connection.executemany(*write)
+            if None in writes:
+                connection.close()
+                return
+
+    def start_session(self):
+        self.writes.put(("INSERT INTO sessions (id, started) VALUES (?, ?)", [(self.session, time.time())]))
+
+    def record_run(self, level_number, score, ticks, cause, seed):
+        self.writes.put((INSERT_RUN, [(self.session, level_number, score, ticks, cause, seed, time.time())]))
+
+    def record_counts(self, counts):
+        if counts:
+            self.writes.put((ADD_COUNT, [(self.session, name, count) for name, count in counts.items()]))
+
+    def top(self, level_number, n=10):
+        # [(score, ticks, finished)], best first.
+        return self.reader.execute("SELECT score, ticks, finished FROM runs WHERE level = ? ORDER BY score DESC LIMIT ?",
+                                   (level_number, n)).fetchall()
+
+    def best(self, level_number):
+        scores = self.top(level_number, 1)
+        return scores[0][0] if scores else None
+
+    def session_counts(self, session=None):
+        return dict(self.reader.execute("SELECT name, count FROM session_counts WHERE session = ?",
+                                        (session or self.session,)))
+
+    def close(self):
+        # Blocks until everything queued so far is written.
+        self.writes.put(("UPDATE sessions SET ended = ? WHERE id = ?", [(time.time(), self.session)]))
+        self.writes.put(None)
+        self.writer.join()
+        self.reader.close()
+
+
+class SessionRecorder:
+    # Follows a game tick by tick and hands the store a run whenever a level attempt ends, with the counters
+    # gathered since the last one: ticks, apples eaten by type and deaths by cause.
+    def __init__(self, store, game):
+        self.store = store
+        self.game = game
+        self.level_ticks = 0
+        self.counts = collections.Counter()
+        store.start_session()
+
+    def step(self, level, events):
+        self.level_ticks += 1
+        self.counts["ticks"] += 1
+        for event in events:
+            if event.kind == APPLE_EATEN:
+                self.counts["apple:" + type(event.other).__name__] += 1
+            elif event.kind in GAME_OVER_EVENTS:
+                self.counts["death:" + event.kind] += 1
+                self.end_run(level, event.kind)
+            elif event.kind in (LEVEL_UP, GAME_COMPLETED):
+                self.end_run(level, event.kind)
+
+    def end_run(self, level, cause):
+        self.store.record_run(level.level_number, self.game.last_score, self.level_ticks, cause, self.game.seed)
+        self.flush()
+        self.level_ticks = 0
+
+    def flush(self):
+        self.store.record_counts(self.counts)
+        self.counts = collections.Counter()
+
+
+def main():
+    # scores.py [level] [n] prints the top n runs of a level, the arcade's by default, and the last session's counters.
+    level_number = int(sys.argv[1]) if len(sys.argv) > 1 else ARCADE_LEVEL
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    store = ScoreStore(scores_path)
+    for rank, (score, ticks, finished) in enumerate(store.top(level_number, n), 1):
+        print(f"{rank:>3}. {score:>6}  {ticks:>7} ticks  {time.strftime('%Y-%m-%d %H:%M', time.localtime(finished))}")
+    last_session = store.reader.execute("SELECT id FROM sessions ORDER BY started DESC LIMIT 1").fetchone()
+    if last_session:
+        print(", ".join(f"{name} {count}" for name, count in sorted(store.session_counts(last_session[0]).items())))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import hashlib
+import os
+
+import pygame
+
+from engine import DIRECTION_NAMES, TAIL, BODY, TURN, HEAD, OPPOSITE
+
+# Every sprite gets a fixed integer ID at import, without touching the disk. Once the display exists,
+# SpriteAtlas loads the PNGs a single time, scales them to the cell size and packs them into one
+# display-format surface, optionally cached on disk as a single image. The cache is only fresh while it is
+# newer than every PNG, and its file name carries ATLAS_LAYOUT, so a change to the sprite list or the
+# columns writes a new atlas instead of loading one with the sprites in the wrong places.
+
+PART_NAMES = ("TAIL", "BODY", "TURN", "HEAD")
+DIRECTIONS = tuple(name.upper() for name in DIRECTION_NAMES)
+SNAKE_SPRITE_NAMES = [f"{PART_NAMES[part]}-{direction}" for part in (TAIL, BODY, HEAD) for direction in DIRECTIONS] + \
+                     [f"TURN-{towards}-{came_from}" for towards in DIRECTIONS for came_from in DIRECTIONS
+                      if towards != came_from and DIRECTIONS.index(came_from) != OPPOSITE[DIRECTIONS.index(towards)]]
+CELL_SPRITE_NAMES = ["FLOOR-1", "GRASS-0", "GRASS-1", "GRASS-2", "GRASS", "OBSTACLE", "WALL-1", "WALL-BACKGROUND",
+                     "WALL-SIDE-E-W", "WALL-SIDE-N-E", "WALL-SIDE-N-S", "WALL-SIDE-N-W", "WALL-SIDE-S-E",
+                     "WALL-SIDE-S-N", "WALL-SIDE-S-W", "WALL-SIDE-W-E"]
+APPLE_SPRITE_NAMES = ["APPLE", "APPLE_GOLDEN", "APPLE_SHRINK", "APPLE_WITHERED"]
+SPRITE_FILES = [("snake", f"SNAKE-{name}.png") for name in SNAKE_SPRITE_NAMES] + \
+               [("level", f"{name}.png") for name in CELL_SPRITE_NAMES] + \
+               [("apple", f"{name}.png") for name in APPLE_SPRITE_NAMES]
+SPRITE_IDS = {name: sprite_id for sprite_id, name in
+              enumerate(SNAKE_SPRITE_NAMES + CELL_SPRITE_NAMES + APPLE_SPRITE_NAMES)}
+ATLAS_COLUMNS = 8
+ATLAS_LAYOUT = hashlib.sha1(repr((SPRITE_FILES, ATLAS_COLUMNS)).encode()).hexdigest()[:12]
+
+SNAKE_SPRITE_IDS = [None] * 64
+for _part in (TAIL, BODY, HEAD):
+    for _towards in range(4):
+        SNAKE_SPRITE_IDS[_part << 4 | _towards << 2] = SPRITE_IDS[f"{PART_NAMES[_part]}-{DIRECTIONS[_towards]}"]
+for _towards in range(4):
+    for _came_from in range(4):
+        _name = f"TURN-{DIRECTIONS[_towards]}-{DIRECTIONS[_came_from]}"
+        if _name in SPRITE_IDS:
+            SNAKE_SPRITE_IDS[TURN << 4 | _towards << 2 | _came_from] = SPRITE_IDS[_name]
+
+
+def snake_sprite_id(part, towards, came_from=None):
+    return SNAKE_SPRITE_IDS[part << 4 | towards << 2 | (came_from or 0)]
+
+
+class SpriteAtlas:
+    def __init__(self, assets_path, cell_size, cache_path=None):
+        self.assets_path = assets_path
+        self.cell_size = cell_size
+        self.cache_path = cache_path
+        self.surface = None
+        self.sprites = []
+
+    def __getitem__(self, sprite_id):
+        return self.sprites[sprite_id]
+
+    def is_loaded(self):
+        return self.surface is not None
+
+    def source_paths(self):
+        return [os.path.join(self.assets_path, directory, file_name) for directory, file_name in SPRITE_FILES]
+
+    def cache_is_fresh(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        cache_time = os.path.getmtime(self.cache_path)
+        return all(os.path.getmtime(path) <= cache_time for path in self.source_paths())
+
+    def build(self):
+        rows = -(-len(SPRITE_FILES) // ATLAS_COLUMNS)
+        atlas = pygame.Surface((ATLAS_COLUMNS * self.cell_size, rows * self.cell_size), pygame.SRCALPHA)
+        for sprite_id, path in enumerate(self.source_paths()):
+            image = pygame.image.load(path)
+            if image.get_size() != (self.cell_size, self.cell_size):
+                image = pygame.transform.smoothscale(image.convert_alpha(), (self.cell_size, self.cell_size))
+            atlas.blit(image, self.sprite_rect(sprite_id))
+        if self.cache_path:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            pygame.image.save(atlas, self.cache_path)
+        return atlas
+
+    def sprite_rect(self, sprite_id):
+        row, column = divmod(sprite_id, ATLAS_COLUMNS)
+        return pygame.Rect(column * self.cell_size, row * self.cell_size, self.cell_size, self.cell_size)
+
+    def load(self):
+        if self.cache_is_fresh():
+            atlas = pygame.image.load(self.cache_path)
+        else:
+            atlas = self.build()
+        self.surface = atlas.convert_alpha()
+        self.sprites = [self.surface.subsurface(self.sprite_rect(sprite_id)) for sprite_id in range(len(SPRITE_FILES))]
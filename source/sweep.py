@@ -0,0 +1,144 @@
+import argparse
+import collections
+import itertools
+import json
+import os
+import random
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+import campaign
+from engine import HIT_WALL, BIT_TAIL, BIT_SELF, GAME_OVER_EVENTS
+from policies import POLICIES
+
+# Balance sweeps: bots play a campaign level headlessly for every combination of the swept settings, spread
+# over worker processes. Results stream to a directory with one raw array file per column plus columns.json,
+# which lists the columns' array typecodes and the settings of every config index.
+#
+#   python sweep.py --level 3 --policy greedy --games 10000 --set apples.golden=20,40,60 --out sweep-3
+#   python sweep.py --level 3 --set effects.golden.max_points=5,8 --set effects.shrinking.grow=-5,-3
+#
+# Every game's seed is in the output, and a game can be replayed from it exactly.
+
+CAUSES = ("timeout", HIT_WALL, BIT_TAIL, BIT_SELF, "level_up")
+TIMEOUT = 0
+LEVEL_UP = 4
+COLUMNS = (("config", "I"), ("seed", "Q"), ("ticks", "I"), ("score", "i"), ("length", "I"), ("cause", "B"))
+TASK_SIZE = 250
+
+
+def play_games(task):
+    level_number, policy_name, settings, seeds, max_ticks = task
+    level = campaign.build_level(level_number, **settings)
+    policy = POLICIES[policy_name]
+    results = {name: array(typecode) for name, typecode in COLUMNS[1:]}
+    for seed in seeds:
+        level.random = random.Random(seed)
+        policy_rng = random.Random(f"policy-{seed}")
+        level.start()
+        cause = TIMEOUT
+        ticks = 0
+        while ticks < max_ticks:
+            events = level.step(policy(level, policy_rng))
+            ticks += 1
+            if events and events[-1].kind in GAME_OVER_EVENTS:
+                cause = CAUSES.index(events[-1].kind)
+                break
+            if level.score >= level.score_to_level_up > 0:
+                cause = LEVEL_UP
+                break
+        results["seed"].append(seed)
+        results["ticks"].append(ticks)
+        results["score"].append(level.score)
+        results["length"].append(len(level.snake))
+        results["cause"].append(cause)
+    return results
+
+
+def parse_setting(text):
+    name, _, values = text.partition("=")
+    if not values:
+        raise argparse.ArgumentTypeError(f"expected name=value[,value...], got {text!r}")
+    return name, [float(value) if "." in value else int(value) for value in values.split(",")]
+
+
+class ColumnWriter:
+    def __init__(self, path, configs):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "columns.json"), "w") as file:
+            json.dump({"columns": COLUMNS, "causes": CAUSES, "configs": configs}, file, indent=1)
+        self.files = {name: open(os.path.join(path, name + ".bin"), "wb") for name, _ in COLUMNS}
+
+    def write(self, results):
+        for name, values in results.items():
+            values.tofile(self.files[name])
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+
+
+def read_columns(path):
+    with open(os.path.join(path, "columns.json")) as file:
+        schema = json.load(file)
+    columns = {}
+    for name, typecode in schema["columns"]:
+        columns[name] = array(typecode)
+        with open(os.path.join(path, name + ".bin"), "rb") as file:
+            columns[name].frombytes(file.read())
+    return columns, schema
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a level headlessly over a grid of settings.")
+    parser.add_argument("--level", type=int, default=campaign.FIRST_LEVEL, choices=sorted(campaign.LEVELS))
+    parser.add_argument("--policy", default="greedy", choices=sorted(POLICIES))
+    parser.add_argument("--games", type=int, default=1000, help="games per config")
+    parser.add_argument("--set", type=parse_setting, action="append", default=[], dest="settings",
+                        help="a level setting and the values to sweep, e.g. apples_number=1,2,4, apples.golden=20,40 "
+                             "or effects.golden.grow=1,2")
+    parser.add_argument("--max-ticks", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default="sweep-results")
+    args = parser.parse_args()
+
+    names = [name for name, _ in args.settings]
+    configs = [dict(zip(names, values)) for values in itertools.product(*(values for _, values in args.settings))]
+    tasks = []
+    task_configs = []
+    for config, settings in enumerate(configs):
+        first_seed = (args.seed << 32) + config * args.games
+        for start in range(0, args.games, TASK_SIZE):
+            seeds = range(first_seed + start, first_seed + min(start + TASK_SIZE, args.games))
+            tasks.append((args.level, args.policy, settings, seeds, args.max_ticks))
+            task_configs.append(config)
+
+    writer = ColumnWriter(args.out, configs)
+    summaries = [{"games": 0, "ticks": 0, "score": 0, "causes": collections.Counter()} for _ in configs]
+    started = time.perf_counter()
+    with ProcessPoolExecutor(args.workers) as executor:
+        for config, results in zip(task_configs, executor.map(play_games, tasks)):
+            results["config"] = array("I", [config]) * len(results["seed"])
+            writer.write(results)
+            summary = summaries[config]
+            summary["games"] += len(results["seed"])
+            summary["ticks"] += sum(results["ticks"])
+            summary["score"] += sum(results["score"])
+            summary["causes"].update(results["cause"])
+    writer.close()
+    elapsed = time.perf_counter() - started
+
+    games = sum(summary["games"] for summary in summaries)
+    ticks = sum(summary["ticks"] for summary in summaries)
+    print(f"{games} games, {ticks} ticks in {elapsed:.1f} s ({games / elapsed:.0f} games/s, {ticks / elapsed:.0f} ticks/s)")
+    for settings, summary in zip(configs, summaries):
+        print(f"{settings or 'defaults'}: mean score {summary['score'] / summary['games']:.2f}, "
+              f"mean ticks {summary['ticks'] / summary['games']:.0f}, "
+              + ", ".join(f"{CAUSES[cause]} {count / summary['games']:.1%}"
+                          for cause, count in sorted(summary["causes"].items())))
+
+
+if __name__ == "__main__":
+    main()